@@ -1,53 +1,83 @@
-from fastapi import FastAPI, UploadFile, File, Form, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Header, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from typing import List
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from datetime import datetime
+import csv
+import io
+import json
 import os
-import sqlite3
 import logging
 import sys
+import asyncio
+import time
+import config
+import database
+from instrumentation import REGISTRY, CACHE_LOOKUPS, STAGE_ERRORS, gauge, server_timing
+from worker_pool import VerificationPool, PoolSaturated, JobTimeout
+from jobs import JobStore, format_sse
+from storage import (UploadTooLarge, InvalidUpload, save_multipart, submission_key, load_cached_results,
+                     store_results, json_default)
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG,
+logging.basicConfig(level=config.LOG_LEVEL,
                    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
                    handlers=[logging.StreamHandler(sys.stdout)])
 logger = logging.getLogger(__name__)
 
+# Photos per board submission
+MIN_PHOTOS, MAX_PHOTOS = 2, 3
+
 # Create required directories first
 os.makedirs("static", exist_ok=True)
 os.makedirs("static/css", exist_ok=True)
 os.makedirs("templates", exist_ok=True)
-os.makedirs("uploads", exist_ok=True)
+os.makedirs(config.UPLOAD_DIR, exist_ok=True)
 
 # Initialize FastAPI with all static resources
 app = FastAPI(debug=True)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-# Initialize database
-def init_db():
-    conn = sqlite3.connect("database.db")
-    c = conn.cursor()
-    c.execute("""CREATE TABLE IF NOT EXISTS submissions
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  filename TEXT, status TEXT, score REAL, reason TEXT,
-                  lat REAL, lon REAL, timestamp TEXT, device TEXT,
-                  depth REAL, cluster INTEGER)""")
-    conn.commit()
-    conn.close()
+# Create or migrate the database schema
+database.init_db()
+
+# Lazy handles: the pipeline and its models are only imported by the workers
+from pipeline import verify_submission, rescore_submission, init_models, stage_timer, PIPELINE_VERSION
+
+# Verification runs on a warm worker pool so the event loop stays responsive
+pool = VerificationPool(config.VERIFY_WORKERS, config.VERIFY_QUEUE_SIZE,
+                        config.VERIFY_JOB_TIMEOUT, initializer=init_models,
+                        startup_timeout=config.VERIFY_STARTUP_TIMEOUT)
 
-# Initialize database
-init_db()
+gauge("verification_pool_admitted", "Verification jobs running or queued", lambda: pool.admitted)
+gauge("verification_pool_queue_depth", "Verification jobs waiting for a worker", lambda: pool.queue_depth)
+gauge("verification_pool_ready", "1 once every worker has loaded its models", lambda: pool.ready)
 
-# Import verification module - must be after app initialization
-from verification import verify_photos
+jobs = JobStore(config.JOB_TTL_SECONDS, config.JOB_MAX)
+gauge("verification_jobs", "Asynchronous jobs held in memory", lambda: len(jobs))
 
 @app.on_event("startup")
 async def startup_event():
-    """Log successful startup"""
+    """Load and warm the models in the background and log successful startup"""
+    # The upload form is served while models load; /ready reports when they are warm
+    app.state.pool_startup = asyncio.create_task(run_in_threadpool(pool.start))
     logger.info("FastAPI application started successfully")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    pool.shutdown()
+
+def busy_response(request: Request, message: str, status_code: int):
+    """Render an error page that asks the client to retry later."""
+    return templates.TemplateResponse("results.html", {
+        "request": request,
+        "error": message,
+        "results": [],
+    }, status_code=status_code, headers={"Retry-After": str(config.VERIFY_RETRY_AFTER)})
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     import traceback
@@ -56,72 +86,244 @@ async def global_exception_handler(request: Request, exc: Exception):
         status_code=500
     )
 
+@app.get("/ready")
+async def readiness():
+    """Report healthy only once every model is loaded and warmed."""
+    if pool.ready:
+        return JSONResponse({"status": "ready"})
+    startup = getattr(app.state, "pool_startup", None)
+    status = "failed" if startup is not None and startup.done() else "loading"
+    return JSONResponse({"status": status}, status_code=503)
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for this process and its verification workers."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/", response_class=HTMLResponse)
 async def get_upload_form(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
+async def save_uploads(request: Request) -> Tuple[List[str], List[str], List[str]]:
+    """Stream a request's photos to content-addressed storage, hashing as they arrive.
+
+    Returns the saved paths, their SHA-256 hashes and the client filenames.
+    """
+    return await save_multipart(request, config.UPLOAD_DIR, config.UPLOAD_MAX_BYTES, MIN_PHOTOS, MAX_PHOTOS)
+
+async def verify_uploads(saved_paths: List[str], hashes: List[str], names: List[str],
+                         on_event: Optional[Callable[[Dict[str, Any]], None]] = None
+                         ) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """Verify saved uploads (or rescore stored results) and store the outcome.
+
+    Returns the results and the stage timings of the run.
+    """
+    # The same photos already verified by this pipeline version need no model
+    # run, but reuse and clustering depend on history and are checked again
+    key = submission_key(hashes)
+    stored = await run_in_threadpool(
+        load_cached_results, config.DATABASE_PATH, key, PIPELINE_VERSION, hashes, names)
+    CACHE_LOOKUPS.inc("result", "miss" if stored is None else "hit")
+    if stored is not None:
+        logger.info(f"Rescoring stored results for submission {key[:12]}")
+        verification_results, timings = await pool.run(rescore_submission, stored, names)
+    else:
+        verification_results, timings = await pool.run(verify_submission, saved_paths, names,
+                                                       on_event=on_event)
+
+    # Store results in database
+    start = time.perf_counter()
+    await run_in_threadpool(store_results, verification_results, key, PIPELINE_VERSION)
+    timings["db_insert"] = time.perf_counter() - start
+    stage_timer.add("db_insert", timings["db_insert"])
+    return verification_results, timings
+
 @app.post("/verify_boards/", response_class=HTMLResponse)
-async def verify_boards(
-    request: Request,
-    files: List[UploadFile] = File(...)
-):
-    if len(files) < 2 or len(files) > 3:
-        return templates.TemplateResponse("results.html", {
-            "request": request,
-            "error": "Please upload 2-3 photos per board.",
-            "results": [],
-            "map_urls": []
-        })
+async def verify_boards(request: Request):
+    """Verify 2-3 photos posted as the ``files`` fields of a multipart form."""
+    if not pool.ready:
+        return busy_response(request, "Models are still loading, please retry shortly.", 503)
+
+    # Fail fast before reading the uploads when the admission queue is full
+    if pool.saturated:
+        return busy_response(request, "Server is busy, please retry shortly.", 503)
 
     try:
-        # Save uploaded files
-        saved_paths = []
-        for file in files:
-            file_path = os.path.join("uploads", file.filename)
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
-            saved_paths.append(file_path)
-
-        # Run verification
-        verification_results, maps = verify_photos(saved_paths)
-
-        # Store results in database
-        conn = sqlite3.connect("database.db")
-        c = conn.cursor()
-        for result in verification_results:
-            metadata = result["metadata"]
-            c.execute("""INSERT INTO submissions 
-                        (filename, status, score, reason, lat, lon, timestamp, 
-                         device, depth, cluster)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                     (result["file"], result["status"], 
-                      result["score"], 
-                      ", ".join(result["reason"]),
-                      metadata["lat"], metadata["lon"],
-                      metadata["timestamp"].isoformat() if metadata["timestamp"] else None,
-                      metadata["device"], result["depth"], result["cluster"]))
-        conn.commit()
-        conn.close()
+        saved_paths, hashes, names = await save_uploads(request)
+        verification_results, timings = await verify_uploads(saved_paths, hashes, names)
 
+        headers = {"Server-Timing": server_timing(timings)} if config.SERVER_TIMING and timings else None
         return templates.TemplateResponse("results.html", {
             "request": request,
             "results": verification_results,
-            "map_urls": maps,
             "error": None
-        })
+        }, headers=headers)
 
+    except UploadTooLarge as e:
+        return templates.TemplateResponse("results.html", {
+            "request": request,
+            "error": str(e),
+            "results": [],
+        }, status_code=413)
+    except InvalidUpload as e:
+        return templates.TemplateResponse("results.html", {
+            "request": request,
+            "error": str(e),
+            "results": [],
+        }, status_code=400)
+    except PoolSaturated:
+        return busy_response(request, "Server is busy, please retry shortly.", 503)
+    except JobTimeout:
+        return busy_response(request, "Verification timed out, please retry.", 504)
     except Exception as e:
-        logger.error(f"Error processing upload: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+        STAGE_ERRORS.inc("request")
+        logger.exception(f"Error processing upload: {str(e)}")
         return templates.TemplateResponse("results.html", {
             "request": request,
             "error": f"Error processing upload: {str(e)}",
             "results": [],
-            "map_urls": []
         })
 
+async def run_job(job, saved_paths: List[str], hashes: List[str], names: List[str]):
+    """Verify a job's uploads in the background, publishing its events."""
+    try:
+        results, _ = await verify_uploads(saved_paths, hashes, names, on_event=job.progress)
+        job.complete(results)
+    except PoolSaturated:
+        job.fail("Server is busy, please retry shortly.")
+    except JobTimeout:
+        job.fail("Verification timed out, please retry.")
+    except Exception as e:
+        STAGE_ERRORS.inc("request")
+        logger.exception(f"Error processing job {job.id}: {str(e)}")
+        job.fail(f"Error processing upload: {str(e)}")
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: Request):
+    """Start verifying 2-3 photos (multipart ``files`` fields) and return a job id at once.
+
+    Follow the job with ``GET /jobs/{id}/events`` (Server-Sent Events) or
+    poll ``GET /jobs/{id}``.
+    """
+    headers = {"Retry-After": str(config.VERIFY_RETRY_AFTER)}
+    if not pool.ready:
+        return JSONResponse({"error": "Models are still loading, please retry shortly."},
+                            status_code=503, headers=headers)
+    if pool.saturated:
+        return JSONResponse({"error": "Server is busy, please retry shortly."},
+                            status_code=503, headers=headers)
+    try:
+        saved_paths, hashes, names = await save_uploads(request)
+    except UploadTooLarge as e:
+        return JSONResponse({"error": str(e)}, status_code=413)
+    except InvalidUpload as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    job = jobs.create(names)
+    job.task = asyncio.create_task(run_job(job, saved_paths, hashes, names))
+    return JSONResponse({"id": job.id, "status": f"/jobs/{job.id}", "events": f"/jobs/{job.id}/events"},
+                        status_code=202, headers={"Location": f"/jobs/{job.id}"})
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job state and the photo results so far, for clients that poll."""
+    job = jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Unknown job"}, status_code=404)
+    return JSONResponse(json.loads(json.dumps(job.snapshot(), default=json_default)))
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, last_event_id: Optional[int] = Header(None)):
+    """Stream a job's events as Server-Sent Events, ending after ``complete`` or ``error``.
+
+    Reconnecting clients send ``Last-Event-ID`` and resume after that event.
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Unknown job"}, status_code=404)
+    after = last_event_id if last_event_id is not None else -1
+
+    async def frames():
+        async for event in job.stream(after):
+            yield format_sse(event)
+
+    return StreamingResponse(frames(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def export_rows(rows, fmt: str, page_size: int = 1000):
+    """Serialize submission dicts as NDJSON or CSV, one chunk per ``page_size`` rows."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=database.SUBMISSION_COLUMNS) if fmt == "csv" else None
+    if writer is not None:
+        writer.writeheader()
+    count = 0
+    for row in rows:
+        if writer is not None:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row) + "\n")
+        count += 1
+        if count % page_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def geojson_features(rows):
+    """Stream geotagged submissions as one GeoJSON FeatureCollection."""
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ""
+    for row in rows:
+        properties = {k: v for k, v in row.items() if k not in ("lat", "lon")}
+        feature = {"type": "Feature", "id": row["id"], "properties": properties,
+                   "geometry": {"type": "Point", "coordinates": [row["lon"], row["lat"]]}}
+        yield separator + json.dumps(feature)
+        separator = ","
+    yield "]}"
+
+@app.get("/submissions/geojson")
+def submissions_geojson(
+    ids: Optional[str] = None,
+    status: Optional[str] = None,
+    device: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: Optional[int] = 10000
+):
+    """Geotagged submissions as GeoJSON, drawn by static/map.html.
+
+    ``ids`` is a comma-separated list of submission ids.
+    """
+    try:
+        id_list = [int(i) for i in ids.split(",") if i.strip()] if ids else None
+    except ValueError:
+        return JSONResponse({"error": "ids must be comma-separated integers"}, status_code=400)
+    rows = database.iter_submissions(ids=id_list, status=status, device=device, since=since,
+                                     until=until, geotagged=True, limit=limit)
+    return StreamingResponse(geojson_features(rows), media_type="application/geo+json")
+
+@app.get("/submissions/export")
+def export_submissions(
+    format: str = "ndjson",
+    status: Optional[str] = None,
+    device: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    min_score: Optional[float] = None,
+    max_score: Optional[float] = None,
+    after_id: int = 0,
+    limit: Optional[int] = None
+):
+    """Stream matching submissions as NDJSON or CSV in constant memory."""
+    if format not in ("ndjson", "csv"):
+        return JSONResponse({"error": "format must be 'ndjson' or 'csv'"}, status_code=400)
+    rows = database.iter_submissions(status=status, device=device, since=since, until=until,
+                                     min_score=min_score, max_score=max_score,
+                                     after_id=after_id, limit=limit)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(export_rows(rows, format), media_type=media_type, headers={
+        "Content-Disposition": f"attachment; filename=submissions.{format}"})
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
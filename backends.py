@@ -0,0 +1,188 @@
+"""Inference backends for the depth (MiDaS) and scene (EfficientNet) models.
+
+``reference`` runs the TorchScript and SavedModel artifacts written by
+prepare_models.py; ``onnx`` runs graphs exported from them with ONNX
+Runtime, int8-quantized by default. Each backend imports its framework
+only when it is loaded, so an ONNX worker never imports torch or
+TensorFlow. Choose with ``INFERENCE_BACKEND``.
+
+Both depth backends take a batch of normalized CHW images and return the
+depth maps at the model's native output resolution, shape ``(N, h, w)``;
+nothing is interpolated, since callers only keep summaries of them. Both scene
+backends take a batch of 224x224 RGB images (0-255 floats) and return
+``(lat, lon)`` rows.
+"""
+from typing import Iterator, Optional, Sequence, Tuple
+import os
+import numpy as np
+import config
+
+DEPTH_INPUT = "image"
+SCENE_INPUT = "image"
+
+
+def onnx_path(artifact: str, quantized: bool, model_dir: Optional[str] = None) -> str:
+    """Path of an exported graph, e.g. ``models/midas_small.int8.onnx``."""
+    base = os.path.splitext(artifact)[0]
+    return os.path.join(model_dir or config.MODEL_DIR, base + (".int8" if quantized else "") + ".onnx")
+
+
+class TorchDepth:
+    """MiDaS TorchScript module on CPU."""
+
+    name = "reference"
+
+    def __init__(self, path: str):
+        import torch
+        self.torch = torch
+        self.model = torch.jit.load(path, map_location="cpu")
+        self.model.eval()
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        torch = self.torch
+        with torch.no_grad():
+            return self.model(torch.from_numpy(batch)).numpy()
+
+
+def _session(path: str):
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if config.ONNX_THREADS:
+        options.intra_op_num_threads = config.ONNX_THREADS
+    return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+
+class OnnxDepth:
+    """MiDaS graph on ONNX Runtime."""
+
+    name = "onnx"
+
+    def __init__(self, path: str):
+        self.session = _session(path)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {DEPTH_INPUT: batch})[0]
+
+
+class TensorFlowScene:
+    """EfficientNet SavedModel through its compiled ``forward`` function."""
+
+    name = "reference"
+
+    def __init__(self, path: str):
+        import tensorflow as tf
+        self.tf = tf
+        self.model = tf.saved_model.load(path)
+        # Compiled forward pass; avoids the per-call setup cost of predict()
+        self.forward = self.model.forward
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        tf = self.tf
+        batch = tf.keras.applications.efficientnet_v2.preprocess_input(batch)
+        return self.forward(tf.convert_to_tensor(batch)).numpy()
+
+
+class OnnxScene:
+    """EfficientNet graph on ONNX Runtime.
+
+    EfficientNetV2 rescales inside the model (its ``preprocess_input`` is a
+    pass-through), so the batch is fed as is.
+    """
+
+    name = "onnx"
+
+    def __init__(self, path: str):
+        self.session = _session(path)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {SCENE_INPUT: batch})[0]
+
+
+def depth_signature(backend: Optional[str] = None, quantized: Optional[bool] = None) -> str:
+    """Name of the depth artifact ``load_depth`` would run, e.g. ``midas_small.int8.onnx``."""
+    backend = backend or config.INFERENCE_BACKEND
+    quantized = config.ONNX_QUANTIZED if quantized is None else quantized
+    if backend == "onnx":
+        return os.path.basename(onnx_path(config.MIDAS_ARTIFACT, quantized))
+    return config.MIDAS_ARTIFACT
+
+
+def load_depth(backend: Optional[str] = None, quantized: Optional[bool] = None,
+               model_dir: Optional[str] = None):
+    backend = backend or config.INFERENCE_BACKEND
+    quantized = config.ONNX_QUANTIZED if quantized is None else quantized
+    if backend == "onnx":
+        return OnnxDepth(onnx_path(config.MIDAS_ARTIFACT, quantized, model_dir))
+    return TorchDepth(os.path.join(model_dir or config.MODEL_DIR, config.MIDAS_ARTIFACT))
+
+
+def load_scene(backend: Optional[str] = None, quantized: Optional[bool] = None,
+               model_dir: Optional[str] = None):
+    backend = backend or config.INFERENCE_BACKEND
+    quantized = config.ONNX_QUANTIZED if quantized is None else quantized
+    if backend == "onnx":
+        return OnnxScene(onnx_path(config.SCENE_ARTIFACT, quantized, model_dir))
+    return TensorFlowScene(os.path.join(model_dir or config.MODEL_DIR, config.SCENE_ARTIFACT))
+
+
+def export_depth(model_dir: str, input_size: int, opset: int = 17) -> str:
+    """Export the TorchScript MiDaS module to ONNX with a dynamic batch axis."""
+    import torch
+    model = torch.jit.load(os.path.join(model_dir, config.MIDAS_ARTIFACT), map_location="cpu")
+    model.eval()
+    path = onnx_path(config.MIDAS_ARTIFACT, False, model_dir)
+    torch.onnx.export(model, torch.zeros(1, 3, input_size, input_size), path, opset_version=opset,
+                      input_names=[DEPTH_INPUT], output_names=["depth"],
+                      dynamic_axes={DEPTH_INPUT: {0: "batch"}, "depth": {0: "batch"}})
+    return path
+
+
+def export_scene(model_dir: str, opset: int = 17) -> str:
+    """Export the scene SavedModel's ``forward`` function to ONNX."""
+    import tensorflow as tf
+    import tf2onnx
+    model = tf.saved_model.load(os.path.join(model_dir, config.SCENE_ARTIFACT))
+    path = onnx_path(config.SCENE_ARTIFACT, False, model_dir)
+    spec = [tf.TensorSpec([None, 224, 224, 3], tf.float32, name=SCENE_INPUT)]
+    tf2onnx.convert.from_function(model.forward, input_signature=spec, opset=opset, output_path=path)
+    return path
+
+
+class _CalibrationReader:
+    """Feeds preprocessed sample batches to the static quantizer."""
+
+    def __init__(self, input_name: str, batches: Iterator[np.ndarray]):
+        self.input_name = input_name
+        self.batches = batches
+
+    def get_next(self):
+        batch = next(self.batches, None)
+        return None if batch is None else {self.input_name: batch}
+
+
+def quantize(model_path: str, input_name: str, calibration: Sequence[np.ndarray]) -> str:
+    """Write an int8 (QDQ, per-channel) copy of a graph, calibrated on ``calibration``.
+
+    Static quantization keeps the convolutions in int8 kernels; dynamic
+    quantization would only cover the matrix multiplies.
+    """
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    prepared = model_path.replace(".onnx", ".prep.onnx")
+    quant_pre_process(model_path, prepared)
+    output = model_path.replace(".onnx", ".int8.onnx")
+    try:
+        quantize_static(prepared, output, _CalibrationReader(input_name, iter(calibration)),
+                        quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    finally:
+        os.remove(prepared)
+    return output
+
+
+def parity(reference: np.ndarray, candidate: np.ndarray) -> Tuple[float, float]:
+    """Largest absolute and relative difference between two backends' outputs."""
+    diff = np.abs(np.asarray(candidate, dtype=np.float64) - np.asarray(reference, dtype=np.float64))
+    scale = np.maximum(np.abs(np.asarray(reference, dtype=np.float64)), 1e-6)
+    return float(diff.max()), float((diff / scale).max())
@@ -0,0 +1,262 @@
+"""Bulk verification of photo archives.
+
+Groups are verified together the way one web submission is (2-3 photos of
+the same board). Groups come from a directory (each subdirectory is a
+group; loose photos are grouped ``--group-size`` at a time in name order)
+or from a JSONL manifest with one JSON list of photo paths per line:
+
+    python batch_verify.py uploads/ --workers 4 --output audit.jsonl
+    python batch_verify.py groups.jsonl --db
+
+Finished groups are recorded in a checkpoint file after their results are
+written, so rerunning the same command after an interruption resumes
+where it stopped. Checkpoint entries are keyed on the source and the
+group's photo paths, so runs over different archives can share a
+checkpoint file. A worker that dies takes its pool down with it; the pool
+is restarted and the groups in flight are retried.
+"""
+from typing import Any, Dict, List, Tuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+import config
+from pipeline import init_models
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"}
+
+Group = Tuple[str, List[str]]  # group id, photo paths
+
+# Pool restarts a group may be in flight for before it is counted as failed
+MAX_POOL_RESTARTS = 2
+
+
+def groups_from_directory(root: str, group_size: int) -> List[Group]:
+    groups, loose = [], []
+    for entry in sorted(os.scandir(root), key=lambda e: e.name):
+        if entry.is_dir():
+            photos = [os.path.join(entry.path, name) for name in sorted(os.listdir(entry.path))
+                      if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS]
+            if photos:
+                groups.append((entry.name, photos))
+        elif os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+            loose.append(entry.path)
+    for start in range(0, len(loose), group_size):
+        chunk = loose[start:start + group_size]
+        groups.append(("/".join(os.path.basename(p) for p in chunk), chunk))
+    return groups
+
+
+def groups_from_manifest(path: str) -> List[Group]:
+    base = os.path.dirname(os.path.abspath(path))
+    groups = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if line.strip():
+                photos = [p if os.path.isabs(p) else os.path.join(base, p) for p in json.loads(line)]
+                groups.append((f"line {line_no}", photos))
+    return groups
+
+
+def group_key(source: str, photos: List[str]) -> str:
+    """Checkpoint key of a group: its source and photo paths, not its id."""
+    paths = [os.path.abspath(source)] + [os.path.abspath(p) for p in photos]
+    return hashlib.sha256("\n".join(paths).encode("utf-8")).hexdigest()
+
+
+def load_checkpoint(path: str) -> set:
+    """Keys of the finished groups; each line is a key, a tab and the group id."""
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.split("\t", 1)[0].rstrip("\n") for line in f if line.strip()}
+
+
+def _verify_group(photos: List[str]) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """Run the pipeline on one group; returns its results and per-stage seconds."""
+    from verification import verify_photos, stage_timer
+    before = stage_timer.snapshot()
+    results = verify_photos(photos, [os.path.basename(p) for p in photos])
+    return results, stage_timer.delta(stage_timer.snapshot(), before)
+
+
+class ResultWriter:
+    """Buffers finished groups and writes them, then the checkpoint, in bulk."""
+
+    def __init__(self, source: str, output: str, use_db: bool, checkpoint: str, flush_every: int):
+        self.source = source
+        self.output = output
+        self.use_db = use_db
+        self.checkpoint = checkpoint
+        self.flush_every = flush_every
+        self.pending: List[Tuple[Group, List[Dict[str, Any]]]] = []
+
+    def add(self, group: Group, results: List[Dict[str, Any]]):
+        self.pending.append((group, results))
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        if self.use_db:
+            import database
+            from storage import write_results
+            with database.transaction() as conn:
+                for _, results in self.pending:
+                    write_results(conn, results)
+        else:
+            from storage import json_default
+            with open(self.output, "a", encoding="utf-8") as f:
+                for (group_id, photos), results in self.pending:
+                    f.write(json.dumps({"group": group_id, "photos": photos, "results": results},
+                                       default=json_default) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        with open(self.checkpoint, "a", encoding="utf-8") as f:
+            f.writelines(f"{group_key(self.source, photos)}\t{group_id}\n"
+                         for (group_id, photos), _ in self.pending)
+            f.flush()
+            os.fsync(f.fileno())
+        self.pending = []
+
+
+def run(groups: List[Group], workers: int, writer: ResultWriter) -> Dict[str, Any]:
+    """Verify every group and return run statistics."""
+    stages: Dict[str, float] = {}
+    done = failed = images = 0
+    start = time.perf_counter()
+
+    def finish(group: Group, outcome):
+        nonlocal done, images
+        results, stage_seconds = outcome
+        for name, seconds in stage_seconds.items():
+            stages[name] = stages.get(name, 0.0) + seconds
+        writer.add(group, results)
+        done += 1
+        images += len(results)
+        if done % 10 == 0:
+            elapsed = time.perf_counter() - start
+            logger.info(f"{done}/{len(groups)} groups, {images / elapsed:.2f} images/s")
+
+    if workers <= 0:
+        init_models()
+        for group in groups:
+            try:
+                finish(group, _verify_group(group[1]))
+            except Exception as e:
+                failed += 1
+                logger.error(f"Group {group[0]} failed: {e}")
+    else:
+        context = multiprocessing.get_context("spawn")
+        queued = iter(groups)
+        retries: List[Group] = []
+        restarts: Dict[str, int] = {}
+        in_flight = {}
+        executor = ProcessPoolExecutor(workers, mp_context=context, initializer=init_models)
+        try:
+            while True:
+                # Keep every worker busy without queueing the whole archive
+                broken = False
+                while len(in_flight) < 2 * workers:
+                    group = retries.pop() if retries else next(queued, None)
+                    if group is None:
+                        break
+                    try:
+                        in_flight[executor.submit(_verify_group, group[1])] = group
+                    except BrokenProcessPool:
+                        broken = True
+                        retries.append(group)
+                        break
+                if not in_flight and not broken:
+                    break
+                lost: List[Group] = []
+                if not broken:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        group = in_flight.pop(future)
+                        try:
+                            finish(group, future.result())
+                        except BrokenProcessPool:
+                            broken = True
+                            lost.append(group)
+                        except Exception as e:
+                            failed += 1
+                            logger.error(f"Group {group[0]} failed: {e}")
+                    if not broken:
+                        continue
+                # The worker that died is not known, so every group in flight
+                # is retried on a new pool, up to MAX_POOL_RESTARTS times
+                lost.extend(in_flight.values())
+                in_flight = {}
+                executor.shutdown(wait=True)
+                for group in lost:
+                    restarts[group[0]] = restarts.get(group[0], 0) + 1
+                    if restarts[group[0]] > MAX_POOL_RESTARTS:
+                        failed += 1
+                        logger.error(f"Group {group[0]} failed: a worker died "
+                                     f"{restarts[group[0]]} times while it was in flight")
+                    else:
+                        retries.append(group)
+                logger.warning(f"A worker died; restarting the pool and retrying {len(retries)} groups")
+                executor = ProcessPoolExecutor(workers, mp_context=context, initializer=init_models)
+        finally:
+            executor.shutdown(wait=True)
+    writer.flush()
+    return {"groups": done, "failed": failed, "images": images,
+            "elapsed": time.perf_counter() - start, "stages": stages}
+
+
+def print_report(stats: Dict[str, Any], skipped: int):
+    elapsed = stats["elapsed"]
+    images = stats["images"]
+    print(f"Verified {images} images in {stats['groups']} groups "
+          f"({stats['failed']} failed, {skipped} already done) in {elapsed:.1f} s")
+    if images:
+        print(f"Throughput: {images / elapsed:.2f} images/s")
+        print("Stage time (summed over workers):")
+        for name, seconds in sorted(stats["stages"].items(), key=lambda s: -s[1]):
+            print(f"  {name:<16} {seconds:9.2f} s  {seconds * 1000 / images:9.1f} ms/image")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify an archive of photo groups")
+    parser.add_argument("source", help="Directory of photos or JSONL manifest of photo groups")
+    parser.add_argument("--workers", type=int, default=max(1, config.VERIFY_WORKERS),
+                        help="Worker processes, each with its own models (0 runs inline)")
+    parser.add_argument("--group-size", type=int, default=3,
+                        help="Photos per group for loose files in a directory")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--output", help="Append results to this JSONL file")
+    target.add_argument("--db", action="store_true", help="Store results in the database")
+    parser.add_argument("--checkpoint", help="Finished-group list (default: <output>.done)")
+    parser.add_argument("--flush-every", type=int, default=20, help="Groups per bulk write")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        handlers=[logging.StreamHandler(sys.stdout)])
+
+    if os.path.isdir(args.source):
+        groups = groups_from_directory(args.source, args.group_size)
+    else:
+        groups = groups_from_manifest(args.source)
+    checkpoint = args.checkpoint or (args.output + ".done" if args.output else "batch_verify.done")
+    finished = load_checkpoint(checkpoint)
+    todo = [group for group in groups if group_key(args.source, group[1]) not in finished]
+    logger.info(f"{len(groups)} groups, {len(groups) - len(todo)} already done, {len(todo)} to verify")
+
+    writer = ResultWriter(args.source, args.output, args.db, checkpoint, args.flush_every)
+    stats = run(todo, args.workers, writer)
+    print_report(stats, len(groups) - len(todo))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+from typing import Any, Callable, List
+from concurrent.futures import Future
+import logging
+import queue
+import threading
+from instrumentation import BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Merge requests from many callers into batched calls.
+
+    Items submitted from any thread are queued; a background thread takes
+    everything queued, up to ``max_batch_size`` items, and calls ``fn`` once
+    with the whole list. It never waits for more: items that arrive while a
+    batch runs form the next one, and ``submit_many`` queues a caller's items
+    together so they share a batch. ``fn`` must return one output per input,
+    in order; each caller's future receives its own output, and a short
+    result fails the futures left without one.
+
+    A batcher only merges items submitted in its own process. A worker
+    process runs one verification at a time, so under the process pool
+    batches span the photos of a single request, not concurrent requests;
+    only ``VERIFY_WORKERS=0`` lets concurrent requests share a batch. Batch
+    sizes are exported as ``verification_inference_batch_size``.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], max_batch_size: int = 8,
+                 name: str = "batcher"):
+        self.fn = fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.name = name
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, item: Any) -> Future:
+        """Queue one input and return a future for its output."""
+        return self.submit_many([item])[0]
+
+    def submit_many(self, items: List[Any]) -> List[Future]:
+        """Queue several inputs at once; returns their futures, in order."""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name=self.name,
+                                                    daemon=True)
+                    self._thread.start()
+        entries = [(item, Future()) for item in items]
+        if entries:
+            self._queue.put(entries)
+        return [future for _, future in entries]
+
+    def __call__(self, item: Any) -> Any:
+        return self.submit(item).result()
+
+    def _loop(self):
+        batch = []
+        while True:
+            if not batch:
+                batch = self._queue.get()
+            # Take whatever else is already queued; nothing more is waited for
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.extend(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._run(batch[:self.max_batch_size])
+            batch = batch[self.max_batch_size:]
+
+    def _run(self, batch):
+        BATCH_SIZE.observe(len(batch), self.name)
+        try:
+            outputs = list(self.fn([item for item, _ in batch]))
+            for (_, future), output in zip(batch, outputs):
+                future.set_result(output)
+            if len(outputs) != len(batch):
+                raise ValueError(f"{self.name} returned {len(outputs)} outputs for {len(batch)} inputs")
+        except Exception as e:
+            logger.error(f"{self.name} batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
@@ -0,0 +1,390 @@
+"""Per-stage benchmark of the verification pipeline.
+
+Times each stage of verification.py over the decodable sample photos in
+uploads/ and synthetic 2, 12 and 50 MP board photos, then reports p50/p95/p99
+latency, throughput and peak RSS. Results can be saved as a JSON baseline;
+comparing against one exits non-zero when a stage regresses past the
+threshold:
+
+    python benchmark.py --stub --save-baseline bench_baseline.json
+    python benchmark.py --stub --compare bench_baseline.json --threshold 0.25
+
+``--stub`` replaces the depth and scene models, Tesseract and the remote
+geocoder with cheap local stand-ins so the suite runs offline and without
+model artifacts; the surrounding pre- and post-processing still runs. Map
+rendering is no longer part of verification (maps are drawn client-side
+from /submissions/geojson), so it has no stage here.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+import argparse
+import copy
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import cv2
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SYNTHETIC_SIZES_MP = (2, 12, 50)
+
+STAGES = ["decode", "exif", "authenticity", "ocr", "depth", "visual_location",
+          "reuse", "clustering", "verify_photos"]
+
+Corpus = List[Tuple[str, bytes]]  # name, encoded bytes
+
+
+def sample_photos(directory: str = "uploads") -> Corpus:
+    """Every decodable image under ``directory``."""
+    photos = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            with open(os.path.join(root, name), "rb") as f:
+                data = f.read()
+            if cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8) is not None:
+                photos.append((name, data))
+    return photos
+
+
+def synthetic_photo(megapixels: float, seed: int = 0) -> bytes:
+    """JPEG of a noisy outdoor-like scene with a text board, at 4:3."""
+    rng = np.random.default_rng(seed)
+    width = int(math.sqrt(megapixels * 1e6 * 4 / 3))
+    height = width * 3 // 4
+    sky = np.linspace(200, 120, height, dtype=np.float32)[:, None, None]
+    img = np.broadcast_to(sky, (height, width, 3)).astype(np.uint8)
+    img = cv2.add(img, rng.integers(0, 24, (height, width, 3), dtype=np.uint8))
+    x0, y0, x1, y1 = width // 5, height // 4, width * 4 // 5, height * 3 // 4
+    cv2.rectangle(img, (x0, y0), (x1, y1), (245, 245, 245), -1)
+    scale = (x1 - x0) / 900
+    lines = ["Lat 12.9716 Long 77.5946", "MG Road, Bengaluru", f"Board {seed:04d}"]
+    for i, line in enumerate(lines):
+        cv2.putText(img, line, (x0 + int(40 * scale), y0 + int((90 + 110 * i) * scale)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 2.0 * scale, (20, 20, 20), max(1, int(4 * scale)))
+    ok, encoded = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return encoded.tobytes()
+
+
+class _StubOCREngine:
+    """Stands in for Tesseract: returns a fixed board text."""
+
+    signature = "benchmark-stub"
+    backend = "stub"
+
+    def start(self):
+        pass
+
+    def recognize(self, binary: np.ndarray) -> Dict[str, Any]:
+        from ocr_engine import find_text_regions
+        regions = find_text_regions(binary)
+        return {"text": "MG Road, Bengaluru\nBoard", "words": [], "regions": len(regions),
+                "backend": self.backend}
+
+
+def install_stubs(verification):
+    """Swap models, OCR and the remote geocoder for offline stand-ins."""
+    from geocoding import Geocoder, GeocodeCache, RemoteGeocoder
+    verification.depth_batcher.fn = lambda images: np.stack(
+        [verification.midas_transform(img)[0] for img in images])
+    verification.scene_batcher.fn = lambda images: [(12.97, 77.59) for _ in images]
+    verification.ocr_engine = _StubOCREngine()
+    verification.geocoder = Geocoder(
+        GeocodeCache(os.path.join(tempfile.mkdtemp(), "geocode.db")),
+        remote=RemoteGeocoder(lambda address: (12.9716, 77.5946), min_interval=0.0))
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(samples: List[float], items: int) -> Dict[str, float]:
+    """Latency percentiles in ms and throughput in items per second."""
+    values = np.array(samples) * 1000
+    return {"n": len(samples),
+            "p50_ms": float(np.percentile(values, 50)),
+            "p95_ms": float(np.percentile(values, 95)),
+            "p99_ms": float(np.percentile(values, 99)),
+            "mean_ms": float(values.mean()),
+            "throughput_per_s": items / (values.sum() / 1000) if values.sum() else 0.0}
+
+
+def bench_corpus(verification, corpus: Corpus, iterations: int, warmup: int,
+                 workdir: str) -> Dict[str, Dict[str, float]]:
+    """Time every stage over a corpus; returns per-stage summaries."""
+    from image_context import ImageContext
+    timings: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    items: Dict[str, int] = {stage: 0 for stage in STAGES}
+
+    def timed(stage: str, record: bool, fn: Callable, *args, count: int = 1):
+        start = time.perf_counter()
+        value = fn(*args)
+        if record:
+            timings[stage].append(time.perf_counter() - start)
+            items[stage] += count
+        return value
+
+    def decode(path, data):
+        ctx = ImageContext(path, data)
+        ctx.image  # Decoding is lazy; force it inside the timing
+        return ctx
+
+    def run_ocr_uncached(ctx):
+        return verification.ocr_engine.recognize(verification.preprocess_image_for_ocr(ctx))
+
+    def run_depth_uncached(ctx):
+        depth = verification.depth_batcher.submit(ctx.resized_rgb(384)).result()
+        return verification.depth_features(depth)
+
+    paths = []
+    for i, (name, data) in enumerate(corpus):
+        path = os.path.join(workdir, f"{i}_{name}")
+        with open(path, "wb") as f:
+            f.write(data)
+        paths.append(path)
+    group = paths[:3]
+    no_text = (None, None, 0.0, "")
+
+    for iteration in range(warmup + iterations):
+        record = iteration >= warmup
+        for path, (_, data) in zip(paths, corpus):
+            ctx = timed("decode", record, decode, path, data)
+            timed("exif", record, verification.extract_exif_metadata, ctx)
+            timed("authenticity", record, verification.analyze_image_authenticity, ctx)
+            timed("ocr", record, run_ocr_uncached, ctx)
+            timed("depth", record, run_depth_uncached, ctx)
+            timed("visual_location", record, verification.detect_location_from_image, ctx, no_text)
+            timed("reuse", record, verification.check_photo_reuse, ctx)
+            ctx.release()
+        locations = [(12.9716 + 1e-5 * i, 77.5946) for i in range(3)]
+        timed("clustering", record, verification.cluster_geolocations, locations)
+        timed("verify_photos", record, verification.verify_photos, group, count=len(group))
+
+    return {stage: summarize(timings[stage], items[stage]) for stage in STAGES if timings[stage]}
+
+
+def check_scoring(verification, trials: int = 300, seed: int = 0) -> List[str]:
+    """Differences between score_clusters and the pairwise oracle on random batches."""
+    from tests.reference import random_batch, reference_score_clusters
+    rng = np.random.default_rng(seed)
+    mismatches = []
+    for trial in range(trials):
+        batch = random_batch(rng, int(rng.integers(1, 80)), int(rng.integers(1, 6)))
+        expected, actual = copy.deepcopy(batch), copy.deepcopy(batch)
+        reference_score_clusters(expected)
+        verification.score_clusters(actual)
+        for want, got in zip(expected, actual):
+            if (want["score"], want["status"], want["reason"]) != (got["score"], got["status"], got["reason"]):
+                mismatches.append(f"trial {trial}, {want['file']}: {want['score']!r} {want['status']} "
+                                  f"{len(want['reason'])} reasons vs {got['score']!r} {got['status']} "
+                                  f"{len(got['reason'])} reasons")
+    return mismatches
+
+
+def bench_scoring(verification, photos: int, seed: int = 0) -> float:
+    """Seconds to score a site audit of ``photos`` photos, about 50 per cluster."""
+    rng = np.random.default_rng(seed)
+    start = datetime(2025, 9, 14)
+    results = [{
+        "file": f"photo_{i}.jpg", "status": None, "score": 1.0, "reason": [],
+        "metadata": {"lat": None, "lon": None, "device": f"device_{rng.integers(0, 200)}",
+                     "timestamp": start + timedelta(seconds=float(rng.uniform(0, 30 * 86400)))},
+        "depth": float(rng.normal(300, 80)), "cluster": int(rng.integers(0, max(1, photos // 50))),
+    } for i in range(photos)]
+    begin = time.perf_counter()
+    verification.score_clusters(results)
+    return time.perf_counter() - begin
+
+
+def check_tiling(verification, sizes: Tuple[float, ...] = (0.3, 2, 12), seed: int = 0) -> List[str]:
+    """Differences between the striped ELA/noise statistics and whole-image ones.
+
+    ELA means and block means must match exactly and the Laplacian
+    variance within tiling.VARIANCE_RTOL, at stripe heights from one JPEG
+    MCU row up to more than the whole image.
+    """
+    import tiling
+    from tests.reference import whole_image_ela
+    rng = np.random.default_rng(seed)
+    images = [(f"synthetic_{mp}mp", cv2.imdecode(np.frombuffer(synthetic_photo(mp, i), np.uint8),
+                                                 cv2.IMREAD_COLOR)) for i, mp in enumerate(sizes)]
+    images.append(("noise", rng.integers(0, 256, (1001, 777, 3), dtype=np.uint8)))
+    images.append(("tiny", rng.integers(0, 256, (7, 9, 3), dtype=np.uint8)))
+    qualities = (75, 90, 95)
+    mismatches = []
+    for name, img in images:
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        means, blocks = whole_image_ela(img, qualities)
+        variance = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        for rows in (16, 48, 500, 4096):
+            striped_means, striped_blocks = tiling.error_level_analysis(img, qualities, stripe_rows=rows)
+            striped_variance = tiling.laplacian_variance(gray, rows)
+            if not np.array_equal(striped_means, means):
+                mismatches.append(f"{name}, {rows} rows: ELA {striped_means} vs {means}")
+            if not np.array_equal(striped_blocks, blocks):
+                mismatches.append(f"{name}, {rows} rows: {int((striped_blocks != blocks).sum())} "
+                                  f"ELA blocks differ")
+            if abs(striped_variance - variance) > tiling.VARIANCE_RTOL * max(variance, 1.0):
+                mismatches.append(f"{name}, {rows} rows: noise {striped_variance!r} vs {variance!r}")
+    return mismatches
+
+
+# Must stay out of the web tier's startup; workers import them on demand
+HEAVY_MODULES = ("verification", "numpy", "cv2", "sklearn", "torch", "tensorflow",
+                 "onnxruntime", "pytesseract")
+
+
+def measure_import(module: str = "app", runs: int = 3) -> Tuple[float, List[str]]:
+    """Best of ``runs`` fresh interpreters importing ``module``: seconds, and
+    the heavy modules it pulled in."""
+    workdir = tempfile.mkdtemp(prefix="import_")
+    env = dict(os.environ, DATABASE_PATH=os.path.join(workdir, "import.db"),
+               UPLOAD_DIR=os.path.join(workdir, "uploads"))
+    code = (f"import sys, time; start = time.perf_counter(); import {module}; "
+            f"print(time.perf_counter() - start, "
+            f"','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules) or '-')")
+    best, loaded = float("inf"), []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+        seconds, modules = out.strip().splitlines()[-1].split()
+        best = min(best, float(seconds))
+        loaded = [m for m in modules.split(",") if m != "-"]
+    return best, loaded
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], metric: str,
+            threshold: float, min_delta_ms: float) -> List[str]:
+    """Stages whose ``metric`` is more than ``threshold`` (fraction) above the baseline."""
+    regressions = []
+    for corpus, stages in current["results"].items():
+        for stage, summary in stages.items():
+            base = baseline.get("results", {}).get(corpus, {}).get(stage)
+            if base is None:
+                continue
+            now, before = summary[metric], base[metric]
+            if now > before * (1 + threshold) and now - before > min_delta_ms:
+                regressions.append(f"{corpus}/{stage}: {metric} {before:.1f} -> {now:.1f} ms "
+                                   f"({(now / before - 1) * 100 if before else float('inf'):+.0f}%)")
+    return regressions
+
+
+def print_report(report: Dict[str, Any]):
+    for corpus, stages in report["results"].items():
+        print(f"\n{corpus}")
+        print(f"  {'stage':<16}{'n':>5}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'items/s':>11}")
+        for stage, s in stages.items():
+            print(f"  {stage:<16}{s['n']:>5}{s['p50_ms']:>11.1f}{s['p95_ms']:>11.1f}"
+                  f"{s['p99_ms']:>11.1f}{s['throughput_per_s']:>11.2f}")
+    rss = report["meta"]["peak_rss_mb"]
+    if rss is not None:
+        print(f"\nPeak RSS: {rss:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the verification pipeline per stage")
+    parser.add_argument("--stub", action="store_true",
+                        help="Use offline stand-ins for the models, OCR and geocoder")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--sizes", default=",".join(str(s) for s in SYNTHETIC_SIZES_MP),
+                        help="Synthetic image sizes in megapixels (empty for none)")
+    parser.add_argument("--samples", default="uploads", help="Sample photo directory ('' to skip)")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="Fail on regressions against a baseline")
+    parser.add_argument("--metric", default="p50_ms", choices=["p50_ms", "p95_ms", "p99_ms", "mean_ms"])
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown as a fraction of the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="Ignore slowdowns smaller than this (timer noise)")
+    parser.add_argument("--import-budget", type=float, metavar="SECONDS", nargs="?", const=1.0,
+                        help="Fail if importing the web app takes longer (default 1.0 s) or "
+                             "loads the pipeline's heavy dependencies, and exit")
+    parser.add_argument("--scoring-check", type=int, metavar="PHOTOS", nargs="?", const=100_000,
+                        help="Check cluster scoring against the pairwise oracle, time it on "
+                             "PHOTOS photos (default 100000) and exit")
+    parser.add_argument("--tiling-check", action="store_true",
+                        help="Check striped ELA and noise statistics against whole-image ones and exit")
+    args = parser.parse_args()
+
+    if args.import_budget is not None:
+        seconds, loaded = measure_import()
+        print(f"import app: {seconds:.2f} s (budget {args.import_budget:.2f} s)")
+        if loaded:
+            print(f"  loaded at startup: {', '.join(loaded)}")
+        sys.exit(1 if seconds > args.import_budget or loaded else 0)
+
+    # Keep the benchmark away from the real database and caches
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["OCR_CACHE_PATH"] = os.path.join(workdir, "ocr_cache.db")
+    os.environ["GEOCODE_CACHE_PATH"] = os.path.join(workdir, "geocode_cache.db")
+    os.environ["DEPTH_STORE_DIR"] = os.path.join(workdir, "depth")
+    import verification
+    if args.scoring_check is not None:
+        mismatches = check_scoring(verification)
+        for line in mismatches[:20]:
+            print(f"  {line}")
+        print(f"Cluster scoring: {len(mismatches)} mismatches against the pairwise oracle")
+        print(f"Scored {args.scoring_check} photos in {bench_scoring(verification, args.scoring_check):.2f} s")
+        sys.exit(1 if mismatches else 0)
+    if args.tiling_check:
+        mismatches = check_tiling(verification)
+        for line in mismatches[:20]:
+            print(f"  {line}")
+        print(f"Striped ELA/noise: {len(mismatches)} mismatches against whole-image statistics")
+        sys.exit(1 if mismatches else 0)
+    if args.stub:
+        install_stubs(verification)
+        verification.preload()  # As init_models does in a worker
+    else:
+        verification.init_models()
+
+    corpora: Dict[str, Corpus] = {}
+    if args.samples:
+        corpora["samples"] = sample_photos(args.samples)
+    for size in filter(None, args.sizes.split(",")):
+        corpora[f"{size}mp"] = [(f"synthetic_{size}mp_{seed}.jpg", synthetic_photo(float(size), seed))
+                                for seed in range(2)]
+
+    report = {"meta": {"python": platform.python_version(), "machine": platform.machine(),
+                       "stub": args.stub, "iterations": args.iterations},
+              "results": {}}
+    for name, corpus in corpora.items():
+        if not corpus:
+            continue
+        print(f"Benchmarking {name} ({len(corpus)} photos)...", file=sys.stderr)
+        report["results"][name] = bench_corpus(verification, corpus, args.iterations,
+                                               args.warmup, workdir)
+    report["meta"]["peak_rss_mb"] = peak_rss_mb()
+    print_report(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.metric, args.threshold, args.min_delta_ms)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo stage regressed more than {args.threshold:.0%} ({args.metric})")
+
+
+if __name__ == "__main__":
+    main()
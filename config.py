@@ -0,0 +1,80 @@
+"""Runtime settings, read from environment variables."""
+import os
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# Attach per-stage timings of each verification as a Server-Timing response header
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+
+DATABASE_PATH = os.environ.get("DATABASE_PATH", "database.db")
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "4"))
+
+# Content-addressed upload storage
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "uploads")
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+
+# Verification worker pool. VERIFY_WORKERS=0 runs jobs on threads in the web process.
+VERIFY_WORKERS = int(os.environ.get("VERIFY_WORKERS", "2"))
+VERIFY_QUEUE_SIZE = int(os.environ.get("VERIFY_QUEUE_SIZE", "8"))
+VERIFY_JOB_TIMEOUT = float(os.environ.get("VERIFY_JOB_TIMEOUT", "120"))
+VERIFY_STARTUP_TIMEOUT = float(os.environ.get("VERIFY_STARTUP_TIMEOUT", "600"))
+VERIFY_RETRY_AFTER = int(os.environ.get("VERIFY_RETRY_AFTER", "5"))
+
+# Asynchronous jobs (POST /jobs) are kept in memory this long after finishing
+JOB_TTL_SECONDS = float(os.environ.get("JOB_TTL_SECONDS", "3600"))
+JOB_MAX = int(os.environ.get("JOB_MAX", "1000"))
+
+# Cost-ordered cascade: run the per-photo checks cheapest first and skip the
+# rest once they can no longer change a photo's status band. Off runs every check.
+VERIFY_CASCADE = os.environ.get("VERIFY_CASCADE", "0") == "1"
+# Check order, or "auto" to order by the stage times measured so far
+CASCADE_ORDER = os.environ.get("CASCADE_ORDER", "reuse,authenticity,location,depth")
+# "band": stop once the worst case cannot change the band; "rejected": only once Rejected
+CASCADE_EXIT = os.environ.get("CASCADE_EXIT", "band")
+
+# MiDaS depth micro-batching (merges the photos of one request; see batching.py)
+DEPTH_BATCH_SIZE = int(os.environ.get("DEPTH_BATCH_SIZE", "8"))
+
+# EfficientNet scene model micro-batching
+SCENE_BATCH_SIZE = int(os.environ.get("SCENE_BATCH_SIZE", "16"))
+
+# Local model artifacts written by prepare_models.py; loading never touches the network
+MODEL_DIR = os.environ.get("MODEL_DIR", "models")
+MIDAS_ARTIFACT = "midas_small.pt"
+SCENE_ARTIFACT = "scene_model"
+
+# "reference" runs the artifacts above with PyTorch and TensorFlow; "onnx" runs
+# the graphs exported by prepare_models.py --onnx and needs neither framework
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "reference")
+ONNX_QUANTIZED = os.environ.get("ONNX_QUANTIZED", "1") == "1"  # int8 graphs
+ONNX_THREADS = int(os.environ.get("ONNX_THREADS", "0"))  # 0: ONNX Runtime default
+
+# OCR result cache (in-process LRU in front of a shared SQLite file)
+OCR_CACHE_PATH = os.environ.get("OCR_CACHE_PATH", os.path.join("cache", "ocr_cache.db"))
+OCR_CACHE_MEMORY_ENTRIES = int(os.environ.get("OCR_CACHE_MEMORY_ENTRIES", "256"))
+OCR_CACHE_MAX_BYTES = int(os.environ.get("OCR_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Rows per stripe for the ELA and noise checks (scratch memory scales with
+# this times the image width, not with the image height)
+STRIPE_ROWS = int(os.environ.get("STRIPE_ROWS", "512"))
+
+# Depth profiles by photo hash (float16 rows, memory-mapped; see depth_store.py)
+DEPTH_STORE_DIR = os.environ.get("DEPTH_STORE_DIR", os.path.join("cache", "depth"))
+
+# Long-lived Tesseract engines per process
+OCR_POOL_SIZE = int(os.environ.get("OCR_POOL_SIZE", "2"))
+
+# Geocoding: local cache, offline gazetteer, optional rate-limited remote fallback
+GEOCODE_CACHE_PATH = os.environ.get("GEOCODE_CACHE_PATH", os.path.join("cache", "geocode_cache.db"))
+GAZETTEER_PATH = os.environ.get("GAZETTEER_PATH", os.path.join("data", "gazetteer.db"))
+GEOCODER_REMOTE = os.environ.get("GEOCODER_REMOTE", "nominatim")  # "nominatim" or "off"
+GEOCODER_MIN_INTERVAL = float(os.environ.get("GEOCODER_MIN_INTERVAL", "1.0"))
+GEOCODER_REMOTE_TIMEOUT = float(os.environ.get("GEOCODER_REMOTE_TIMEOUT", "5"))
+GEOCODER_MAX_PENDING = int(os.environ.get("GEOCODER_MAX_PENDING", "32"))  # Beyond this, unresolved
+
+# Cross-submission photo reuse detection (Hamming radii over 64-bit hashes)
+PHASH_RADIUS = int(os.environ.get("PHASH_RADIUS", "8"))
+DHASH_RADIUS = int(os.environ.get("DHASH_RADIUS", "12"))
+
+# Persistent location clusters (geohash grid over historical lat/lon)
+GEO_CLUSTER_RADIUS_M = float(os.environ.get("GEO_CLUSTER_RADIUS_M", "10"))
+GEOHASH_PRECISION = int(os.environ.get("GEOHASH_PRECISION", "8"))
@@ -1,61 +1,273 @@
-import sqlite3
+"""SQLite data access shared by the web app, workers and tools.
+
+Connections come from a small per-database pool, run in WAL mode (readers
+never block the writer) and start every write with BEGIN IMMEDIATE so
+concurrent writers queue on the busy timeout instead of failing with
+``database is locked``. The schema is versioned through ``PRAGMA
+user_version`` and migrated the first time a database is opened.
+"""
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from contextlib import contextmanager
 from datetime import datetime
+import queue
+import sqlite3
+import threading
+import config
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",  # Durable across crashes in WAL mode, one fsync per checkpoint
+    "PRAGMA cache_size=-20000",  # 20 MB page cache
+    "PRAGMA temp_store=MEMORY",
+)
+
+SUBMISSION_COLUMNS = ["id", "filename", "status", "score", "reason", "lat", "lon",
+                      "timestamp", "device", "depth", "cluster", "submitted_at"]
+
+SubmissionRow = Tuple[str, str, float, str, Optional[float], Optional[float],
+                      Optional[str], Optional[str], float, int]
+
+
+class ConnectionPool:
+    """Up to ``size`` reusable connections to one database file."""
+
+    def __init__(self, path: str, size: int = 4, timeout: float = 30.0):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode: transactions are opened explicitly by transaction()
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                               check_same_thread=False)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            return self._connect()
+        return self._idle.get()
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path: Optional[str] = None) -> ConnectionPool:
+    """Pool for ``path`` (default: the configured database), migrated on first use."""
+    path = path or config.DATABASE_PATH
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = ConnectionPool(path, config.DB_POOL_SIZE)
+            conn = pool.acquire()
+            try:
+                migrate(conn)
+            finally:
+                pool.release(conn)
+            _pools[path] = pool
+    return pool
+
+
+@contextmanager
+def connection(path: Optional[str] = None) -> Iterator[sqlite3.Connection]:
+    """Borrow a pooled connection for reads."""
+    pool = get_pool(path)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextmanager
+def transaction(path: Optional[str] = None) -> Iterator[sqlite3.Connection]:
+    """Borrow a pooled connection inside one write transaction."""
+    with connection(path) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def _create_submissions(conn: sqlite3.Connection):
+    conn.execute("""CREATE TABLE IF NOT EXISTS submissions
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     filename TEXT,
+                     status TEXT,
+                     score REAL,
+                     reason TEXT,
+                     lat REAL,
+                     lon REAL,
+                     timestamp TEXT,
+                     device TEXT,
+                     depth REAL,
+                     cluster INTEGER,
+                     submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)""")
+
 
-def init_db():
-    """Initialize SQLite database with submissions table."""
-    conn = sqlite3.connect("database.db")
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS submissions
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  filename TEXT,
-                  status TEXT,
-                  score REAL,
-                  reason TEXT,
-                  lat REAL,
-                  lon REAL,
-                  timestamp TEXT,
-                  device TEXT,
-                  depth REAL,
-                  cluster INTEGER,
-                  submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    conn.commit()
-    conn.close()
-
-def insert_submission(filename: str, status: str, score: float, reason: str, 
-                     lat: float, lon: float, timestamp: str, device: str, 
-                     depth: float, cluster: int):
+def _add_submitted_at(conn: sqlite3.Connection):
+    # Databases created by older versions of app.py lack this column. SQLite
+    # cannot add a column with a CURRENT_TIMESTAMP default, so inserts set it.
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(submissions)")]
+    if "submitted_at" not in columns:
+        conn.execute("ALTER TABLE submissions ADD COLUMN submitted_at TIMESTAMP")
+
+
+def _create_lookup_tables(conn: sqlite3.Connection):
+    conn.execute("""CREATE TABLE IF NOT EXISTS photo_hashes
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     submission_id INTEGER, filename TEXT,
+                     phash INTEGER, dhash INTEGER)""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS geo_clusters
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT, lat REAL, lon REAL)""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS geo_points
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT, submission_id INTEGER,
+                     geohash TEXT, lat REAL, lon REAL, cluster INTEGER)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_geo_points_geohash ON geo_points(geohash)")
+    conn.execute("""CREATE TABLE IF NOT EXISTS verification_cache
+                    (submission_key TEXT, pipeline_version TEXT, results TEXT,
+                     created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                     PRIMARY KEY (submission_key, pipeline_version))""")
+
+
+def _create_submission_indexes(conn: sqlite3.Connection):
+    for column in ("device", "timestamp", "cluster", "status", "submitted_at"):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_submissions_{column} ON submissions({column})")
+
+
+# Schema version N is reached by applying MIGRATIONS[N - 1]; append, never edit
+MIGRATIONS: List[Callable[[sqlite3.Connection], None]] = [
+    _create_submissions,
+    _add_submitted_at,
+    _create_lookup_tables,
+    _create_submission_indexes,
+]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply pending migrations, each in its own transaction; returns the schema version."""
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(MIGRATIONS):
+                conn.rollback()
+                return version
+            MIGRATIONS[version](conn)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def init_db(path: Optional[str] = None):
+    """Create or upgrade the database schema."""
+    get_pool(path)
+
+
+def insert_submissions(conn: sqlite3.Connection, rows: Sequence[SubmissionRow]) -> List[int]:
+    """Insert ``(filename, status, score, reason, lat, lon, timestamp, device,
+    depth, cluster)`` rows with one executemany; returns their ids in order.
+
+    Must run inside ``transaction()``: the write lock it holds guarantees
+    the new AUTOINCREMENT ids are consecutive.
+    """
+    if not rows:
+        return []
+    conn.executemany("""INSERT INTO submissions (filename, status, score, reason, lat, lon,
+                        timestamp, device, depth, cluster, submitted_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)""", rows)
+    last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    return list(range(last_id - len(rows) + 1, last_id + 1))
+
+
+def insert_submission(filename: str, status: str, score: float, reason: str,
+                      lat: float, lon: float, timestamp: str, device: str,
+                      depth: float, cluster: int) -> int:
     """Insert a submission record into the database."""
-    conn = sqlite3.connect("database.db")
-    c = conn.cursor()
-    c.execute('''INSERT INTO submissions (filename, status, score, reason, lat, lon, 
-                 timestamp, device, depth, cluster)
-                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-              (filename, status, score, reason, lat, lon, str(timestamp), device, depth, cluster))
-    conn.commit()
-    conn.close()
-
-def get_submissions_by_device(device: str):
+    with transaction() as conn:
+        return insert_submissions(conn, [(filename, status, score, reason, lat, lon,
+                                          str(timestamp), device, depth, cluster)])[0]
+
+
+def iter_submissions(status: Optional[str] = None, device: Optional[str] = None,
+                     since: Optional[datetime] = None, until: Optional[datetime] = None,
+                     min_score: Optional[float] = None, max_score: Optional[float] = None,
+                     ids: Optional[Sequence[int]] = None, geotagged: bool = False,
+                     after_id: int = 0, limit: Optional[int] = None,
+                     page_size: int = 1000, path: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Yield matching submissions in id order, reading one page at a time.
+
+    Pages are fetched with keyset pagination (``id > last id``), so each
+    page is an index range scan however deep into the table it is, and a
+    pooled connection is only held while a page is read. ``since`` and
+    ``until`` bound ``submitted_at`` (inclusive, exclusive); ``geotagged``
+    keeps rows with coordinates only; ``after_id`` resumes from the last id
+    a caller saw.
+    """
+    clauses, params = [], []
+    if ids is not None:
+        clauses.append(f"id IN ({', '.join('?' * len(ids))})" if ids else "0")
+        params.extend(ids)
+    if geotagged:
+        clauses.append("lat IS NOT NULL AND lon IS NOT NULL")
+    for clause, value in (("status = ?", status), ("device = ?", device),
+                          ("submitted_at >= ?", since), ("submitted_at < ?", until),
+                          ("score >= ?", min_score), ("score <= ?", max_score)):
+        if value is not None:
+            if isinstance(value, datetime):
+                value = value.strftime("%Y-%m-%d %H:%M:%S")  # CURRENT_TIMESTAMP format
+            clauses.append(clause)
+            params.append(value)
+    where = "".join(f" AND {clause}" for clause in clauses)
+    sql = (f"SELECT {', '.join(SUBMISSION_COLUMNS)} FROM submissions "
+           f"WHERE id > ?{where} ORDER BY id LIMIT ?")
+    last_id, remaining = after_id, limit
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
+        with connection(path) as conn:
+            rows = conn.execute(sql, [last_id, *params, size]).fetchall()
+        for row in rows:
+            yield dict(zip(SUBMISSION_COLUMNS, row))
+        if len(rows) < size:
+            return
+        last_id = rows[-1][0]
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+def get_submissions_by_device(device: str) -> List[Dict[str, Any]]:
     """Retrieve all submissions for a given device."""
-    conn = sqlite3.connect("database.db")
-    c = conn.cursor()
-    c.execute("SELECT * FROM submissions WHERE device = ?", (device,))
-    rows = c.fetchall()
-    conn.close()
-    columns = ["id", "filename", "status", "score", "reason", "lat", "lon", 
-               "timestamp", "device", "depth", "cluster", "submitted_at"]
-    return [dict(zip(columns, row)) for row in rows]
-
-def get_all_submissions():
+    return list(iter_submissions(device=device))
+
+
+def get_all_submissions() -> List[Dict[str, Any]]:
     """Retrieve all submissions for review or analysis."""
-    conn = sqlite3.connect("database.db")
-    c = conn.cursor()
-    c.execute("SELECT * FROM submissions")
-    rows = c.fetchall()
-    conn.close()
-    columns = ["id", "filename", "status", "score", "reason", "lat", "lon", 
-               "timestamp", "device", "depth", "cluster", "submitted_at"]
-    return [dict(zip(columns, row)) for row in rows]
+    return list(iter_submissions())
+
 
 if __name__ == "__main__":
     # Initialize database when module is run directly
-    init_db()
\ No newline at end of file
+    init_db()
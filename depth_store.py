@@ -0,0 +1,128 @@
+from typing import List, Optional, Sequence, Tuple
+import os
+import sqlite3
+import threading
+import numpy as np
+import cv2
+
+# Scalar statistics of a depth map, then a THUMBNAIL_SIZE x THUMBNAIL_SIZE thumbnail
+STAT_NAMES = ("mean", "median", "p10", "p25", "p75", "p90", "center")
+THUMBNAIL_SIZE = 32
+FEATURE_DIM = len(STAT_NAMES) + THUMBNAIL_SIZE * THUMBNAIL_SIZE
+ROW_BYTES = FEATURE_DIM * 2  # float16
+
+
+def depth_features(depth: np.ndarray) -> np.ndarray:
+    """Depth profile of one depth map at the model's native output resolution.
+
+    ``center`` is the mean over the middle half of the frame in each axis,
+    where the board usually is. The thumbnail is an area average, so every
+    value is a summary of the native map; nothing is upsampled.
+    """
+    depth = np.asarray(depth, dtype=np.float32)
+    h, w = depth.shape
+    p10, p25, median, p75, p90 = np.percentile(depth, (10, 25, 50, 75, 90))
+    center = depth[h // 4:h - h // 4, w // 4:w - w // 4].mean()
+    thumbnail = cv2.resize(depth, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA)
+    stats = np.array([depth.mean(), median, p10, p25, p75, p90, center], dtype=np.float32)
+    return np.concatenate([stats, thumbnail.ravel()])
+
+
+class DepthStore:
+    """Depth profiles keyed by photo hash and depth model.
+
+    Profiles are float16 rows (about 2 KB each) appended to a flat file that
+    readers memory-map; a SQLite index next to it maps ``(sha256, model)``
+    to a row and keeps the exact mean, which the similar-depth check
+    compares. Writers from any process serialize on the index's write lock.
+    float16 keeps about three significant digits, plenty for comparing
+    profiles, so only the mean is kept at full precision.
+    """
+
+    def __init__(self, directory: str, model: str):
+        self.directory = directory
+        self.model = model
+        self.data_path = os.path.join(directory, "depth_profiles.f16")
+        self.index_path = os.path.join(directory, "depth_index.db")
+        self._map: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(self.directory, exist_ok=True)
+        conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS depth_profiles
+                            (sha256 TEXT, model TEXT, row INTEGER, mean REAL,
+                             PRIMARY KEY (sha256, model))""")
+            open(self.data_path, "ab").close()
+            self._initialized = True
+        return conn
+
+    def _rows(self, rows: Sequence[int]) -> np.ndarray:
+        """Copy profile rows out of the memory map, remapping if the file grew."""
+        with self._lock:
+            needed = max(rows) + 1
+            if self._map is None or self._map.shape[0] < needed:
+                count = os.path.getsize(self.data_path) // ROW_BYTES
+                self._map = np.memmap(self.data_path, dtype=np.float16, mode="r",
+                                      shape=(count, FEATURE_DIM)) if count else None
+            return np.array(self._map[list(rows)])
+
+    def get(self, sha256: str) -> Optional[Tuple[float, np.ndarray]]:
+        """Exact mean depth and float16 profile of a photo, or None."""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT row, mean FROM depth_profiles WHERE sha256 = ? AND model = ?",
+                               (sha256, self.model)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return row[1], self._rows([row[0]])[0]
+
+    def profiles(self, hashes: Sequence[str]) -> np.ndarray:
+        """Profiles for many photos, shape ``(len(hashes), FEATURE_DIM)``; NaN rows where missing."""
+        out = np.full((len(hashes), FEATURE_DIM), np.nan, dtype=np.float16)
+        if not hashes:
+            return out
+        conn = self._connect()
+        try:
+            found = {}
+            for start in range(0, len(hashes), 500):
+                chunk = list(hashes[start:start + 500])
+                found.update(conn.execute(
+                    f"SELECT sha256, row FROM depth_profiles WHERE model = ? "
+                    f"AND sha256 IN ({', '.join('?' * len(chunk))})", [self.model, *chunk]))
+        finally:
+            conn.close()
+        positions: List[int] = [i for i, h in enumerate(hashes) if h in found]
+        if positions:
+            out[positions] = self._rows([found[hashes[i]] for i in positions])
+        return out
+
+    def put(self, sha256: str, features: np.ndarray):
+        """Append a photo's profile unless it is already stored."""
+        payload = np.asarray(features, dtype=np.float16).tobytes()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if conn.execute("SELECT 1 FROM depth_profiles WHERE sha256 = ? AND model = ?",
+                                (sha256, self.model)).fetchone() is None:
+                    # Rows are numbered under the write lock; bytes written for a
+                    # row whose insert never committed are overwritten by the next
+                    row = conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM depth_profiles").fetchone()[0]
+                    with open(self.data_path, "r+b") as f:
+                        f.seek(row * ROW_BYTES)
+                        f.write(payload)
+                    conn.execute("INSERT INTO depth_profiles (sha256, model, row, mean) VALUES (?, ?, ?, ?)",
+                                 (sha256, self.model, row, float(features[0])))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
@@ -0,0 +1,145 @@
+from typing import Dict, Iterable, List, Sequence, Tuple
+import math
+import sqlite3
+from haversine import haversine, Unit
+import database
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat: float, lon: float, precision: int = 8) -> str:
+    """Standard base32 geohash of a point."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if coord >= mid:
+            value = (value << 1) | 1
+            rng[0] = mid
+        else:
+            value <<= 1
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(lat, lon) extent in degrees of one geohash cell."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def provisional_id(label: int) -> int:
+    """Stand-in id for a request-local cluster with no stored neighbours.
+
+    Provisional ids are below -1 (-1 means "not located"), so they never
+    collide with stored cluster ids.
+    """
+    return -2 - label
+
+
+def is_provisional(cluster: int) -> bool:
+    return cluster < -1
+
+
+def store_geo_points(conn: sqlite3.Connection, rows: Iterable[Tuple[int, float, float, int]],
+                     precision: int = 8):
+    """Index ``(submission_id, lat, lon, cluster)`` rows on an open connection."""
+    conn.executemany("""INSERT INTO geo_points (submission_id, geohash, lat, lon, cluster)
+                        VALUES (?, ?, ?, ?, ?)""",
+                     [(sid, geohash_encode(lat, lon, precision), lat, lon, cluster)
+                      for sid, lat, lon, cluster in rows])
+
+
+class GeoIndex:
+    """Geohash grid over every stored photo location, kept in SQLite.
+
+    A radius query reads the few grid cells around the point through the
+    geohash index (a B-tree lookup per cell) and filters them by haversine
+    distance, so it costs O(log n) regardless of history size.
+    """
+
+    def __init__(self, db_path: str, radius_m: float = 10.0, precision: int = 8):
+        self.db_path = db_path
+        self.radius_m = radius_m
+        self.precision = precision
+
+    def _cells(self, lat: float, lon: float) -> List[str]:
+        """Geohash cells that can hold points within ``radius_m`` of the point."""
+        cell_lat, cell_lon = cell_size(self.precision)
+        dlat = self.radius_m / 111320.0
+        dlon = self.radius_m / (111320.0 * max(math.cos(math.radians(lat)), 1e-6))
+        steps_lat = int(math.ceil(dlat / cell_lat))
+        steps_lon = int(math.ceil(dlon / cell_lon))
+        cells = set()
+        for i in range(-steps_lat, steps_lat + 1):
+            for j in range(-steps_lon, steps_lon + 1):
+                plat = max(-90.0, min(90.0, lat + i * cell_lat))
+                plon = (lon + j * cell_lon + 180.0) % 360.0 - 180.0
+                cells.add(geohash_encode(plat, plon, self.precision))
+        return sorted(cells)
+
+    def nearby(self, conn: sqlite3.Connection, lat: float, lon: float) -> List[Tuple[int, float]]:
+        """``(cluster, distance_m)`` of stored points within the radius, nearest first."""
+        cells = self._cells(lat, lon)
+        rows = conn.execute(
+            f"SELECT lat, lon, cluster FROM geo_points WHERE geohash IN ({','.join('?' * len(cells))})",
+            cells).fetchall()
+        hits = []
+        for plat, plon, cluster in rows:
+            distance = haversine((lat, lon), (plat, plon), unit=Unit.METERS)
+            if distance <= self.radius_m:
+                hits.append((cluster, distance))
+        return sorted(hits, key=lambda h: h[1])
+
+    def assign_clusters(self, locations: Sequence[Tuple[float, float]],
+                        labels: Sequence[int]) -> Tuple[List[int], List[int]]:
+        """Map per-request cluster labels onto persistent cluster ids.
+
+        Each local cluster joins the historical cluster nearest to any of its
+        members. A cluster with no earlier photos nearby gets a provisional id
+        (see ``provisional_id``); nothing is written here, and
+        ``resolve_clusters`` allocates the real id when the submission is
+        stored. Returns the cluster id and the number of earlier photos within
+        the radius for every location.
+        """
+        with database.connection(self.db_path) as conn:
+            hits = [self.nearby(conn, lat, lon) for lat, lon in locations]
+        mapping: Dict[int, int] = {}
+        for label in dict.fromkeys(labels):
+            candidates = [h for i, l in enumerate(labels) if l == label for h in hits[i][:1]]
+            if candidates:
+                mapping[label] = min(candidates, key=lambda h: h[1])[0]
+            else:
+                mapping[label] = provisional_id(label)
+        return [mapping[l] for l in labels], [len(h) for h in hits]
+
+    def resolve_clusters(self, conn: sqlite3.Connection, locations: Sequence[Tuple[float, float]],
+                         clusters: Sequence[int]) -> List[int]:
+        """Replace provisional cluster ids with persistent ones, inside the
+        transaction that stores the submission's points.
+
+        Each provisional cluster is matched again against the stored points,
+        which now include any submission committed since verification
+        started, and joins the nearest cluster or allocates a new id. Writers
+        are serialized, so two submissions from the same new spot end up in
+        one cluster, and a submission that is never stored allocates nothing.
+        """
+        mapping: Dict[int, int] = {}
+        for cluster in dict.fromkeys(c for c in clusters if is_provisional(c)):
+            members = [locations[i] for i, c in enumerate(clusters) if c == cluster]
+            candidates = [h for lat, lon in members for h in self.nearby(conn, lat, lon)[:1]]
+            if candidates:
+                mapping[cluster] = min(candidates, key=lambda h: h[1])[0]
+            else:
+                lat = sum(m[0] for m in members) / len(members)
+                lon = sum(m[1] for m in members) / len(members)
+                cursor = conn.execute("INSERT INTO geo_clusters (lat, lon) VALUES (?, ?)", (lat, lon))
+                mapping[cluster] = cursor.lastrowid
+        return [mapping.get(c, c) for c in clusters]
@@ -0,0 +1,269 @@
+"""Address geocoding backed by a local cache and an offline gazetteer.
+
+Lookups go cache -> gazetteer -> optional remote geocoder. Build the
+gazetteer from a CSV (name, lat, lon columns; an OSM place extract exported
+to CSV works) with:
+
+    python geocoding.py load-gazetteer places.csv
+"""
+from typing import Callable, Iterable, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+import argparse
+import csv
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from instrumentation import CACHE_LOOKUPS, STAGE_ERRORS
+
+logger = logging.getLogger(__name__)
+
+Location = Tuple[float, float, float]  # lat, lon, confidence
+
+# Confidence reported for an address resolved by the remote geocoder
+REMOTE_CONFIDENCE = 0.7
+
+
+def normalize_address(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return sqlite3.connect(path, timeout=30, check_same_thread=False)
+
+
+class GeocodeCache:
+    """Persistent map of normalized address to (lat, lon, confidence).
+
+    Misses are cached too (with NULL coordinates) and retried after
+    ``negative_ttl`` seconds.
+    """
+
+    def __init__(self, path: str, negative_ttl: float = 24 * 3600):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = _connect(self.path)
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS geocode_cache
+                                  (address TEXT PRIMARY KEY, lat REAL, lon REAL,
+                                   confidence REAL, source TEXT, created REAL)""")
+            self._conn.commit()
+        return self._conn
+
+    def get(self, address: str):
+        """Return a Location, None for a fresh cached miss, or False if unknown."""
+        with self._lock:
+            row = self._db().execute(
+                "SELECT lat, lon, confidence, created FROM geocode_cache WHERE address = ?",
+                (address,)).fetchone()
+        if row is None:
+            return False
+        lat, lon, confidence, created = row
+        if lat is None:
+            return None if time.time() - created < self.negative_ttl else False
+        return lat, lon, confidence
+
+    def put(self, address: str, location: Optional[Location], source: str):
+        lat, lon, confidence = location if location else (None, None, 0.0)
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO geocode_cache VALUES (?, ?, ?, ?, ?, ?)",
+                       (address, lat, lon, confidence, source, time.time()))
+            db.commit()
+
+
+class Gazetteer:
+    """Offline place-name index in SQLite FTS5."""
+
+    def __init__(self, path: str, min_overlap: float = 0.6, confidence: float = 0.7):
+        self.path = path
+        self.min_overlap = min_overlap
+        self.confidence = confidence
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = _connect(self.path)
+            self._conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS gazetteer
+                                  USING fts5(name, lat UNINDEXED, lon UNINDEXED)""")
+            self._conn.commit()
+        return self._conn
+
+    def load_csv(self, csv_path: str, replace: bool = False) -> int:
+        """Import rows with name/lat/lon (or latitude/longitude) columns."""
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            rows = ((normalize_address(row["name"]),
+                     float(row.get("lat") or row["latitude"]),
+                     float(row.get("lon") or row["longitude"]))
+                    for row in reader if row.get("name"))
+            return self.load(rows, replace)
+
+    def load(self, rows: Iterable[Tuple[str, float, float]], replace: bool = False) -> int:
+        with self._lock:
+            db = self._db()
+            if replace:
+                db.execute("DELETE FROM gazetteer")
+            count = db.executemany("INSERT INTO gazetteer (name, lat, lon) VALUES (?, ?, ?)",
+                                   rows).rowcount
+            db.commit()
+        return count
+
+    def lookup(self, address: str) -> Optional[Location]:
+        """Best match for a normalized address, if enough of its words agree."""
+        tokens = [t for t in address.split() if len(t) > 1]
+        if not tokens:
+            return None
+        query = " OR ".join(f'"{t}"' for t in tokens)
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT name, lat, lon FROM gazetteer WHERE gazetteer MATCH ? ORDER BY rank LIMIT 10",
+                (query,)).fetchall()
+        best, best_overlap = None, 0.0
+        for name, lat, lon in rows:
+            words = set(name.split())
+            # Share of the place name found in the address
+            overlap = len(words.intersection(tokens)) / len(words) if words else 0.0
+            if overlap > best_overlap:
+                best, best_overlap = (float(lat), float(lon)), overlap
+        if best is None or best_overlap < self.min_overlap:
+            return None
+        return best[0], best[1], self.confidence * best_overlap
+
+
+def nominatim_lookup(address: str) -> Optional[Tuple[float, float]]:
+    """Resolve an address through the public Nominatim service."""
+    from geopy.geocoders import Nominatim
+    location = Nominatim(user_agent="board_verification").geocode(address)
+    if location:
+        return location.latitude, location.longitude
+    return None
+
+
+class RemoteQueueFull(Exception):
+    """Raised when ``max_pending`` remote lookups are already queued."""
+
+
+class RemoteGeocoder:
+    """Rate-limited remote fallback running on one background thread.
+
+    ``lookup`` is any ``address -> (lat, lon) | None`` callable, so a local
+    stand-in can replace the network service in tests. At most
+    ``max_pending`` lookups wait or run at once; at one call per
+    ``min_interval`` a longer queue could never drain in time anyway.
+    """
+
+    def __init__(self, lookup: Callable[[str], Optional[Tuple[float, float]]] = nominatim_lookup,
+                 min_interval: float = 1.0, max_pending: int = 32):
+        self.lookup = lookup
+        self.min_interval = min_interval
+        self.max_pending = max(1, max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="geocoder")
+        self._last_call = 0.0
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _call(self, address: str) -> Optional[Location]:
+        wait = self._last_call + self.min_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_call = time.monotonic()
+        result = self.lookup(address)
+        return (result[0], result[1], REMOTE_CONFIDENCE) if result else None
+
+    def submit(self, address: str) -> Future:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise RemoteQueueFull(f"{self._pending} remote geocoding lookups already queued")
+            self._pending += 1
+        future = self._executor.submit(self._call, address)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future: Future):
+        with self._lock:
+            self._pending -= 1
+
+
+class Geocoder:
+    """Cache, then offline gazetteer, then (optionally) the remote geocoder."""
+
+    def __init__(self, cache: GeocodeCache, gazetteer: Optional[Gazetteer] = None,
+                 remote: Optional[RemoteGeocoder] = None, remote_timeout: float = 5.0):
+        self.cache = cache
+        self.gazetteer = gazetteer
+        self.remote = remote
+        self.remote_timeout = remote_timeout
+
+    def geocode(self, text: str) -> Optional[Location]:
+        """Resolve free-form address text to (lat, lon, confidence)."""
+        address = normalize_address(text)
+        if not address:
+            return None
+        cached = self.cache.get(address)
+        CACHE_LOOKUPS.inc("geocode", "miss" if cached is False else "hit")
+        if cached is not False:
+            return cached
+
+        if self.gazetteer is not None:
+            location = self.gazetteer.lookup(address)
+            if location is not None:
+                self.cache.put(address, location, "gazetteer")
+                return location
+
+        if self.remote is None:
+            return None
+        try:
+            pending = self.remote.submit(text)
+        except RemoteQueueFull as e:
+            # Unresolved, but not cached as a miss: a later lookup may get through
+            STAGE_ERRORS.inc("geocode_queue_full")
+            logger.info(f"Not geocoding {address!r} remotely: {e}")
+            return None
+        # Cache the answer whenever it arrives, even if we stop waiting for it
+        pending.add_done_callback(lambda f: self._store_remote(address, f))
+        try:
+            return pending.result(timeout=self.remote_timeout)
+        except FutureTimeout:
+            logger.info(f"Remote geocoding timed out for {address!r}; result will be cached")
+        except Exception as e:
+            STAGE_ERRORS.inc("geocode")
+            logger.warning(f"Geocoding error: {e}")
+        return None
+
+    def _store_remote(self, address: str, future: Future):
+        if future.exception() is None:
+            self.cache.put(address, future.result(), "remote")
+
+
+def main():
+    import config
+    parser = argparse.ArgumentParser(description="Manage the offline gazetteer")
+    sub = parser.add_subparsers(dest="command", required=True)
+    load = sub.add_parser("load-gazetteer", help="Import places from a CSV file")
+    load.add_argument("csv_path")
+    load.add_argument("--db", default=config.GAZETTEER_PATH)
+    load.add_argument("--replace", action="store_true", help="Drop existing places first")
+    lookup = sub.add_parser("lookup", help="Resolve an address offline")
+    lookup.add_argument("address")
+    lookup.add_argument("--db", default=config.GAZETTEER_PATH)
+    args = parser.parse_args()
+
+    gazetteer = Gazetteer(args.db)
+    if args.command == "load-gazetteer":
+        print(f"Loaded {gazetteer.load_csv(args.csv_path, args.replace)} places into {args.db}")
+    else:
+        print(gazetteer.lookup(normalize_address(args.address)))
+
+
+if __name__ == "__main__":
+    main()
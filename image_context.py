@@ -0,0 +1,82 @@
+from typing import Dict, Optional
+from io import BytesIO
+import hashlib
+import os
+import numpy as np
+import cv2
+from PIL import Image
+
+
+class ImageContext:
+    """Decoded state of one photo, shared by every verification stage.
+
+    The file is read once and decoded once; the grayscale view and the
+    resized model inputs are derived lazily from that single decode.
+    """
+
+    def __init__(self, path: str, data: Optional[bytes] = None):
+        self.path = path
+        self.name = os.path.basename(path)
+        if data is None:
+            with open(path, "rb") as f:
+                data = f.read()
+        self.data = data
+        self._sha256 = None
+        self._image = None
+        self._gray = None
+        self._rgb_resized: Dict[int, np.ndarray] = {}
+        self._has_exif = None
+
+    @property
+    def sha256(self) -> str:
+        """Hex SHA-256 of the raw file bytes."""
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.data).hexdigest()
+        return self._sha256
+
+    @property
+    def image(self) -> np.ndarray:
+        """Full-resolution BGR array, decoded on first access."""
+        if self._image is None:
+            img = cv2.imdecode(np.frombuffer(self.data, np.uint8), cv2.IMREAD_COLOR)
+            if img is None:
+                raise ValueError("Unable to read image")
+            self._image = img
+        return self._image
+
+    @property
+    def gray(self) -> np.ndarray:
+        """Full-resolution grayscale view of the decoded image."""
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def resized_rgb(self, size: int) -> np.ndarray:
+        """Square RGB copy at ``size`` x ``size`` (224 for EfficientNet, 384 for MiDaS)."""
+        if size not in self._rgb_resized:
+            resized = cv2.resize(self.image, (size, size), interpolation=cv2.INTER_AREA)
+            self._rgb_resized[size] = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+        return self._rgb_resized[size]
+
+    @property
+    def has_exif(self) -> bool:
+        """Whether the file carries an EXIF block (header parse only, no decode)."""
+        if self._has_exif is None:
+            try:
+                with Image.open(BytesIO(self.data)) as img_pil:
+                    exif = img_pil._getexif() if hasattr(img_pil, '_getexif') else None
+                self._has_exif = bool(exif)
+            except Exception:
+                self._has_exif = False
+        return self._has_exif
+
+    def release_full_resolution(self):
+        """Drop the full-resolution arrays but keep the small model inputs."""
+        self._image = None
+        self._gray = None
+
+    def release(self):
+        """Drop decoded pixel data once every stage is done with the photo."""
+        self._image = None
+        self._gray = None
+        self._rgb_resized.clear()
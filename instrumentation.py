@@ -0,0 +1,237 @@
+"""Timing spans and Prometheus-format metrics for the verification pipeline.
+
+Metrics live in a process-wide registry. Worker processes hand their
+accumulated counts back with every job result (``REGISTRY.drain()``) and
+the web process merges them (``REGISTRY.merge()``), so ``/metrics`` covers
+all workers.
+"""
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from collections import defaultdict
+from contextlib import contextmanager
+import bisect
+import threading
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[tuple(str(l) for l in labels)] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value:g}")
+        return lines
+
+    def drain(self):
+        with self._lock:
+            values, self._values = dict(self._values), defaultdict(float)
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for labels, value in values.items():
+                self._values[labels] += value
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> per-bucket counts (last slot is +Inf), sum
+        self._values: Dict[Labels, Tuple[List[int], float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        key = tuple(str(l) for l in labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total:g}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+    def drain(self):
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for labels, (counts, total) in values.items():
+                mine, my_total = self._values.get(labels) or ([0] * len(counts), 0.0)
+                self._values[labels] = ([a + b for a, b in zip(mine, counts)], my_total + total)
+
+
+class Gauge:
+    """Value read from a callback at scrape time; never sent between processes."""
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge",
+                f"{self.name} {float(self.read()):g}"]
+
+    def drain(self):
+        return None
+
+    def merge(self, values):
+        pass
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def drain(self) -> Dict[str, object]:
+        """Take (and reset) every count recorded in this process."""
+        return {name: metric.drain() for name, metric in list(self.metrics.items())
+                if not isinstance(metric, Gauge)}
+
+    def merge(self, snapshot: Optional[Dict[str, object]]):
+        """Add counts drained from another process."""
+        for name, values in (snapshot or {}).items():
+            metric = self.metrics.get(name)
+            if metric is not None and values:
+                metric.merge(values)
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def gauge(name: str, documentation: str, read: Callable[[], float]) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, read))
+
+
+STAGE_SECONDS = histogram("verification_stage_seconds", "Time spent in each pipeline stage", ["stage"])
+STAGE_ERRORS = counter("verification_stage_errors_total", "Errors caught per pipeline stage", ["stage"])
+CACHE_LOOKUPS = counter("verification_cache_lookups_total", "Cache lookups by cache and outcome",
+                        ["cache", "result"])
+BATCH_SIZE = histogram("verification_inference_batch_size", "Items per batched model call",
+                       ["model"], SIZE_BUCKETS)
+
+_trace = threading.local()
+
+
+@contextmanager
+def trace() -> Iterator[Dict[str, float]]:
+    """Collect the stage spans recorded by this thread into a dict of seconds."""
+    spans: Dict[str, float] = defaultdict(float)
+    previous = getattr(_trace, "spans", None)
+    _trace.spans = spans
+    try:
+        yield spans
+    finally:
+        _trace.spans = previous
+
+
+class StageTimer:
+    """Cumulative wall time and call count per named pipeline stage.
+
+    Every span also feeds the stage latency histogram and, when the
+    current thread is inside ``trace()``, that request's timings.
+    """
+
+    def __init__(self, histogram: Optional[Histogram] = None):
+        self.histogram = histogram
+        self._seconds: Dict[str, float] = defaultdict(float)
+        self._calls: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self._seconds[name] += seconds
+            self._calls[name] += 1
+        if self.histogram is not None:
+            self.histogram.observe(seconds, name)
+        spans = getattr(_trace, "spans", None)
+        if spans is not None:
+            spans[name] += seconds
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Seconds spent in each stage so far."""
+        with self._lock:
+            return dict(self._seconds)
+
+    def calls(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._calls)
+
+    @staticmethod
+    def delta(after: Dict[str, float], before: Dict[str, float]) -> Dict[str, float]:
+        """Per-stage seconds spent between two snapshots."""
+        return {name: seconds - before.get(name, 0.0) for name, seconds in after.items()
+                if seconds - before.get(name, 0.0) > 0}
+
+
+def server_timing(spans: Dict[str, float]) -> str:
+    """Format stage timings as an HTTP ``Server-Timing`` header value."""
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in spans.items())
@@ -0,0 +1,131 @@
+"""In-memory verification jobs for the asynchronous API.
+
+A job collects the progress events its verification reports (``stage``
+after each check, ``photo`` with each photo's result as soon as its last
+check finishes, before the cluster analysis) followed by ``complete`` with the final verdicts or ``error``.
+Events are numbered, so a client can stream them from any point
+(``Last-Event-ID``) or poll a snapshot. Jobs live in the web process and
+are forgotten ``JOB_TTL_SECONDS`` after they finish.
+"""
+from typing import Any, AsyncIterator, Dict, List, Optional
+from collections import OrderedDict
+import asyncio
+import json
+import time
+import uuid
+from storage import json_default
+
+FINISHED_STATES = ("done", "failed")
+
+
+class Job:
+    """One submission's verification progress and results.
+
+    Only touched from the event loop; worker threads hand events over with
+    ``loop.call_soon_threadsafe``.
+    """
+
+    def __init__(self, job_id: str, names: List[str]):
+        self.id = job_id
+        self.names = names
+        self.state = "queued"
+        self.stage: Optional[str] = None
+        self.photos: Dict[str, Dict[str, Any]] = {}
+        self.results: Optional[List[Dict[str, Any]]] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict[str, Any]] = []
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    def publish(self, event: str, data: Dict[str, Any]):
+        self.events.append({"id": len(self.events), "event": event, "data": data})
+        # Wake every waiting stream, then start a fresh generation
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def progress(self, event: Dict[str, Any]):
+        """Record an event reported by verify_photos."""
+        self.state = "running"
+        if event["event"] == "stage":
+            self.stage = event["stage"]
+            self.publish("stage", {k: v for k, v in event.items() if k != "event"})
+        elif event["event"] == "photo":
+            result = event["result"]
+            self.photos[result["file"]] = result
+            self.publish("photo", result)
+
+    def complete(self, results: List[Dict[str, Any]]):
+        self.results = results
+        self.state = "done"
+        self.finished_at = time.time()
+        self.publish("complete", {"results": results})
+
+    def fail(self, message: str):
+        self.error = message
+        self.state = "failed"
+        self.finished_at = time.time()
+        self.publish("error", {"message": message})
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current state for polling clients."""
+        return {"id": self.id, "state": self.state, "stage": self.stage,
+                "photos": len(self.names), "photos_done": len(self.photos),
+                "results": self.results if self.results is not None else list(self.photos.values()),
+                "error": self.error, "events": len(self.events)}
+
+    async def stream(self, after: int = -1, keepalive: float = 15.0
+                     ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield events numbered above ``after`` as they arrive, until the job
+        finishes; yields ``None`` after ``keepalive`` seconds without one."""
+        while True:
+            changed = self._changed
+            while after + 1 < len(self.events):
+                after += 1
+                yield self.events[after]
+            if self.finished:
+                return
+            try:
+                await asyncio.wait_for(changed.wait(), keepalive)
+            except asyncio.TimeoutError:
+                yield None
+
+
+def format_sse(event: Optional[Dict[str, Any]]) -> str:
+    """Encode an event (or a keepalive for ``None``) as a Server-Sent Events frame."""
+    if event is None:
+        return ": keepalive\n\n"
+    data = json.dumps(event["data"], default=json_default)
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {data}\n\n"
+
+
+class JobStore:
+    """Jobs by id, dropping finished ones after ``ttl`` seconds or when over ``max_jobs``."""
+
+    def __init__(self, ttl: float, max_jobs: int):
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def create(self, names: List[str]) -> Job:
+        self._evict()
+        job = Job(uuid.uuid4().hex, names)
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def _evict(self):
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.finished]
+        for job in finished:
+            if now - job.finished_at > self.ttl or len(self._jobs) >= self.max_jobs:
+                del self._jobs[job.id]
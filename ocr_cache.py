@@ -0,0 +1,110 @@
+from typing import Any, Dict, Optional
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class OCRCache:
+    """Two-tier cache of OCR output keyed by image content and OCR config.
+
+    Lookups hit an in-process LRU first, then a SQLite file shared by every
+    worker. The SQLite tier evicts least-recently-used entries once the
+    stored results exceed ``max_bytes``.
+    """
+
+    def __init__(self, path: str, memory_entries: int = 256, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @staticmethod
+    def key(image_sha256: str, ocr_config: str) -> str:
+        return hashlib.sha256(f"{image_sha256}\0{ocr_config}".encode()).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("""CREATE TABLE IF NOT EXISTS ocr_cache
+                            (key TEXT PRIMARY KEY, value TEXT, size INTEGER, last_used REAL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_used ON ocr_cache(last_used)")
+            # Running total of stored bytes, kept by triggers so every process
+            # sharing the file sees the same figure without summing the table
+            conn.execute("""CREATE TABLE IF NOT EXISTS ocr_cache_size
+                            (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)""")
+            conn.execute("""INSERT OR IGNORE INTO ocr_cache_size (id, total)
+                            SELECT 0, COALESCE(SUM(size), 0) FROM ocr_cache""")
+            conn.execute("""CREATE TRIGGER IF NOT EXISTS ocr_cache_size_insert AFTER INSERT ON ocr_cache
+                            BEGIN UPDATE ocr_cache_size SET total = total + NEW.size; END""")
+            conn.execute("""CREATE TRIGGER IF NOT EXISTS ocr_cache_size_update AFTER UPDATE OF size ON ocr_cache
+                            BEGIN UPDATE ocr_cache_size SET total = total + NEW.size - OLD.size; END""")
+            conn.execute("""CREATE TRIGGER IF NOT EXISTS ocr_cache_size_delete AFTER DELETE ON ocr_cache
+                            BEGIN UPDATE ocr_cache_size SET total = total - OLD.size; END""")
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def _remember(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                return value
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE ocr_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+        finally:
+            conn.close()
+        value = json.loads(row[0])
+        self._remember(key, value)
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        self._remember(key, value)
+        payload = json.dumps(value)
+        conn = self._connect()
+        try:
+            # An upsert rather than INSERT OR REPLACE: REPLACE's implicit delete
+            # does not fire the size trigger
+            conn.execute("""INSERT INTO ocr_cache (key, value, size, last_used) VALUES (?, ?, ?, ?)
+                            ON CONFLICT (key) DO UPDATE SET value = excluded.value,
+                            size = excluded.size, last_used = excluded.last_used""",
+                         (key, payload, len(payload), time.time()))
+            total = conn.execute("SELECT total FROM ocr_cache_size").fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(conn, total - int(self.max_bytes * 0.9))
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _evict(conn: sqlite3.Connection, excess: int):
+        """Delete least-recently-used rows until ``excess`` bytes are freed."""
+        freed = 0
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM ocr_cache ORDER BY last_used"):
+            if freed >= excess:
+                break
+            doomed.append((key,))
+            freed += size
+        conn.executemany("DELETE FROM ocr_cache WHERE key = ?", doomed)
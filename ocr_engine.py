@@ -0,0 +1,239 @@
+from typing import Any, Dict, List, Tuple
+from collections import OrderedDict
+import logging
+import queue
+import threading
+import time
+import numpy as np
+import cv2
+from PIL import Image
+import pytesseract
+
+try:  # Optional: in-process Tesseract through the C API
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+Region = Tuple[int, int, int, int]  # x, y, w, h
+
+
+def _same_line(a: Region, b: Region) -> bool:
+    """Boxes overlap vertically by half a line and are at most two heights apart."""
+    overlap = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    gap = max(a[0], b[0]) - min(a[0] + a[2], b[0] + b[2])
+    return overlap >= 0.5 * min(a[3], b[3]) and gap <= 2 * max(a[3], b[3])
+
+
+def _merge_lines(boxes: List[Region]) -> List[Region]:
+    """Merge word blobs that sit on the same text line into one box."""
+    merged = True
+    while merged:
+        merged = False
+        out: List[Region] = []
+        for box in sorted(boxes):
+            for i, other in enumerate(out):
+                if _same_line(other, box):
+                    x0, y0 = min(other[0], box[0]), min(other[1], box[1])
+                    x1 = max(other[0] + other[2], box[0] + box[2])
+                    y1 = max(other[1] + other[3], box[1] + box[3])
+                    out[i] = (x0, y0, x1 - x0, y1 - y0)
+                    merged = True
+                    break
+            else:
+                out.append(box)
+        boxes = out
+    return boxes
+
+
+def find_text_regions(binary: np.ndarray, max_side: int = 1000, max_regions: int = 32,
+                      pad: int = 8) -> List[Region]:
+    """Locate text-bearing regions in a binarized (Otsu) image.
+
+    Works on a downscaled copy: the minority colour is taken as ink, nearby
+    glyphs are merged into line blobs with a wide closing kernel, and the
+    blob bounding boxes are scaled back to full resolution. Returns an empty
+    list when nothing text-like is found or the result is too fragmented,
+    in which case the caller should OCR the whole image.
+    """
+    h, w = binary.shape[:2]
+    scale = min(1.0, max_side / max(h, w))
+    small = cv2.resize(binary, (max(1, int(w * scale)), max(1, int(h * scale))),
+                       interpolation=cv2.INTER_AREA) if scale < 1.0 else binary
+    ink = small if np.mean(small) < 128 else 255 - small
+    ink = cv2.threshold(ink, 127, 255, cv2.THRESH_BINARY)[1]
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 3))
+    blobs = cv2.morphologyEx(ink, cv2.MORPH_CLOSE, kernel)
+    contours, _ = cv2.findContours(blobs, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    regions = []
+    min_height, max_height = 6, small.shape[0] * 0.5
+    for contour in contours:
+        x, y, rw, rh = cv2.boundingRect(contour)
+        # Text lines are wider than tall and neither specks nor half the frame
+        if rh < min_height or rh > max_height or rw < rh:
+            continue
+        regions.append((x, y, rw, rh))
+    regions = _merge_lines(regions)
+    if not regions or len(regions) > max_regions:
+        return []
+
+    full = []
+    for x, y, rw, rh in sorted(regions, key=lambda r: (r[1], r[0])):
+        x0 = max(0, int(x / scale) - pad)
+        y0 = max(0, int(y / scale) - pad)
+        x1 = min(w, int((x + rw) / scale) + pad)
+        y1 = min(h, int((y + rh) / scale) + pad)
+        full.append((x0, y0, x1 - x0, y1 - y0))
+    return full
+
+
+class OCREngine:
+    """Tesseract OCR over in-memory images using long-lived engine instances.
+
+    With ``tesserocr`` installed, up to ``pool_size`` TessBaseAPI instances
+    are kept with their language data loaded and each text region is
+    recognized in-process. Without it, the crop covering every region is
+    sent to a single ``pytesseract`` call, which starts a ``tesseract``
+    process each time; tesserocr is in requirements.txt, so this fallback
+    is only for environments where it cannot be installed. A warning is
+    logged when the engine starts on the fallback.
+    """
+
+    def __init__(self, pool_size: int = 2, lang: str = "eng", psm: int = 6, oem: int = 3,
+                 variables: Dict[str, str] = None):
+        self.pool_size = max(1, pool_size)
+        self.lang = lang
+        self.psm = psm
+        self.oem = oem
+        self.variables = variables or {"preserve_interword_spaces": "1"}
+        self._idle: "queue.Queue" = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self) -> str:
+        return "tesserocr" if tesserocr is not None else "pytesseract"
+
+    @property
+    def signature(self) -> str:
+        """Identifies everything that affects the output; part of the cache key.
+
+        The backends crop differently (per region vs. one covering crop), so
+        their results are cached apart.
+        """
+        options = " ".join(f"-c {k}={v}" for k, v in sorted(self.variables.items()))
+        return f"--oem {self.oem} --psm {self.psm} -l {self.lang} {options} regions {self.backend}"
+
+    def start(self):
+        """Create every engine instance up front (loads the language data)."""
+        if tesserocr is None:
+            logger.warning("tesserocr is not installed; OCR falls back to one tesseract "
+                           "process per call through pytesseract")
+            return
+        instances = []
+        while True:
+            with self._lock:
+                if self._created >= self.pool_size:
+                    break
+            instances.append(self._acquire())
+        for api in instances:
+            self._release(api)
+
+    def _new_api(self):
+        api = tesserocr.PyTessBaseAPI(lang=self.lang, psm=self.psm, oem=self.oem)
+        for name, value in self.variables.items():
+            api.SetVariable(name, value)
+        return api
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.pool_size
+            if create:
+                self._created += 1
+        if create:
+            return self._new_api()
+        return self._idle.get()
+
+    def _release(self, api):
+        self._idle.put(api)
+
+    def recognize(self, binary: np.ndarray) -> Dict[str, Any]:
+        """OCR a binarized image; returns text, per-word boxes, region count and backend.
+
+        The result depends only on the image and the engine's signature, so it
+        can be cached; per-call timings are left to the caller.
+        """
+        start = time.perf_counter()
+        regions = find_text_regions(binary)
+        if tesserocr is not None:
+            words, lines = self._recognize_regions(binary, regions or [(0, 0, binary.shape[1], binary.shape[0])])
+        else:
+            words, lines = self._recognize_subprocess(binary, regions)
+        latency_ms = (time.perf_counter() - start) * 1000
+        logger.debug(f"OCR: {len(regions)} region(s), {len(words)} word(s), "
+                     f"{latency_ms:.1f} ms, backend={self.backend}, pool={self.pool_size}")
+        return {
+            "text": "\n".join(lines),
+            "words": words,
+            "regions": len(regions),
+            "backend": self.backend,
+        }
+
+    def _recognize_regions(self, binary: np.ndarray, regions: List[Region]):
+        words, lines = [], []
+        api = self._acquire()
+        try:
+            for x, y, w, h in regions:
+                api.SetImage(Image.fromarray(binary[y:y + h, x:x + w]))
+                lines.extend(api.GetUTF8Text().splitlines())
+                iterator = api.GetIterator()
+                if iterator is None:
+                    continue
+                level = tesserocr.RIL.WORD
+                for word in tesserocr.iterate_level(iterator, level):
+                    text = word.GetUTF8Text(level)
+                    box = word.BoundingBox(level)
+                    if not text or not text.strip() or box is None:
+                        continue
+                    x0, y0, x1, y1 = box
+                    words.append({"text": text, "conf": float(word.Confidence(level)),
+                                  "left": x + x0, "top": y + y0,
+                                  "width": x1 - x0, "height": y1 - y0})
+        finally:
+            self._release(api)
+        return words, lines
+
+    def _recognize_subprocess(self, binary: np.ndarray, regions: List[Region]):
+        x, y, w, h = 0, 0, binary.shape[1], binary.shape[0]
+        if regions:
+            x = min(r[0] for r in regions)
+            y = min(r[1] for r in regions)
+            w = max(r[0] + r[2] for r in regions) - x
+            h = max(r[1] + r[3] for r in regions) - y
+        options = " ".join(f"-c {k}={v}" for k, v in self.variables.items())
+        data = pytesseract.image_to_data(Image.fromarray(binary[y:y + h, x:x + w]),
+                                         lang=self.lang,
+                                         config=f"--oem {self.oem} --psm {self.psm} {options}",
+                                         output_type=pytesseract.Output.DICT)
+        words = [{"text": data["text"][i], "conf": float(data["conf"][i]),
+                  "left": x + data["left"][i], "top": y + data["top"][i],
+                  "width": data["width"][i], "height": data["height"][i]}
+                 for i in range(len(data["text"])) if data["text"][i].strip()]
+        return words, _data_lines(data)
+
+
+def _data_lines(data: Dict[str, List[Any]]) -> List[str]:
+    """Rebuild text lines from Tesseract's per-word output."""
+    lines = OrderedDict()
+    for i, word in enumerate(data["text"]):
+        line_key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(line_key, [])
+        if word.strip():
+            lines[line_key].append(word)
+    return [" ".join(words) for words in lines.values()]
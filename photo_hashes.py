@@ -0,0 +1,153 @@
+from typing import Dict, Iterable, List, Tuple
+from collections import defaultdict
+from itertools import combinations
+import sqlite3
+import threading
+import numpy as np
+import database
+
+HASH_BITS = 64
+
+
+def phash(gray: np.ndarray) -> int:
+    """64-bit DCT perceptual hash of a grayscale image."""
+    import cv2  # Not at module level: the web process stores hashes without OpenCV
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    median = np.median(low[1:])  # DC term excluded
+    return _pack(low > median)
+
+
+def dhash(gray: np.ndarray) -> int:
+    """64-bit horizontal difference hash of a grayscale image."""
+    import cv2
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    return _pack((small[:, 1:] > small[:, :-1]).flatten())
+
+
+def _pack(bits: np.ndarray) -> int:
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def to_signed(value: int) -> int:
+    """Map an unsigned 64-bit hash into SQLite's signed INTEGER range."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def _flip_masks(bits: int, radius: int) -> List[int]:
+    """Every XOR mask of ``bits`` width with at most ``radius`` bits set."""
+    masks = [0]
+    for r in range(1, radius + 1):
+        for positions in combinations(range(bits), r):
+            masks.append(sum(1 << p for p in positions))
+    return masks
+
+
+class HashIndex:
+    """Multi-index hashing over 64-bit hashes for Hamming-radius search.
+
+    Each hash is split into ``chunks`` disjoint substrings, each with its
+    own lookup table. By the pigeonhole principle, a hash within distance
+    ``r`` of the query matches it within ``r // chunks`` bits on at least one
+    substring, so only those substring neighbourhoods are probed before the
+    exact distance check. About log2(rows) bits per substring keeps buckets
+    small: 3 chunks suit millions of rows.
+    """
+
+    def __init__(self, chunks: int = 3):
+        self.chunks = chunks
+        widths = [HASH_BITS // chunks + (1 if i < HASH_BITS % chunks else 0) for i in range(chunks)]
+        self.layout = [(sum(widths[:i]), (1 << w) - 1, w) for i, w in enumerate(widths)]
+        self.tables = [defaultdict(list) for _ in range(chunks)]
+        self.hashes: Dict[int, int] = {}
+        self._masks: Dict[Tuple[int, int], List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def add(self, item_id: int, value: int):
+        self.hashes[item_id] = value
+        for (shift, mask, _), table in zip(self.layout, self.tables):
+            table[(value >> shift) & mask].append(item_id)
+
+    def search(self, value: int, radius: int) -> List[Tuple[int, int]]:
+        """Return ``(item_id, distance)`` for every hash within ``radius``, nearest first."""
+        sub_radius = radius // self.chunks
+        candidates = set()
+        for (shift, mask, width), table in zip(self.layout, self.tables):
+            key = (width, sub_radius)
+            if key not in self._masks:
+                self._masks[key] = _flip_masks(width, sub_radius)
+            chunk = (value >> shift) & mask
+            for flip in self._masks[key]:
+                ids = table.get(chunk ^ flip)
+                if ids:
+                    candidates.update(ids)
+        matches = []
+        for item_id in candidates:
+            distance = hamming(value, self.hashes[item_id])
+            if distance <= radius:
+                matches.append((item_id, distance))
+        return sorted(matches, key=lambda m: m[1])
+
+
+def store_photo_hashes(conn: sqlite3.Connection, rows: Iterable[Tuple[int, str, int, int]]):
+    """Record ``(submission_id, filename, phash, dhash)`` rows on an open connection."""
+    conn.executemany("INSERT INTO photo_hashes (submission_id, filename, phash, dhash) VALUES (?, ?, ?, ?)",
+                     [(sid, name, to_signed(p), to_signed(d)) for sid, name, p, d in rows])
+
+
+class PhotoHashIndex:
+    """In-memory pHash index over every stored photo, kept in sync with the database.
+
+    The first lookup builds the index from ``photo_hashes``; later lookups
+    only pull rows inserted since (by any process), so the index is updated
+    incrementally.
+    """
+
+    def __init__(self, db_path: str, phash_radius: int = 8, dhash_radius: int = 12,
+                 chunks: int = 3):
+        self.db_path = db_path
+        self.phash_radius = phash_radius
+        self.dhash_radius = dhash_radius
+        self.chunks = chunks
+        self.index = HashIndex(chunks)
+        self.rows: Dict[int, Tuple[int, str, int]] = {}  # id -> submission_id, filename, dhash
+        self.last_id = 0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Load rows added to the database since the last refresh."""
+        with database.connection(self.db_path) as conn:
+            with self._lock:
+                cursor = conn.execute("""SELECT id, submission_id, filename, phash, dhash
+                                         FROM photo_hashes WHERE id > ? ORDER BY id""",
+                                      (self.last_id,))
+                for row_id, submission_id, filename, p, d in cursor:
+                    self.index.add(row_id, to_unsigned(p))
+                    self.rows[row_id] = (submission_id, filename, to_unsigned(d))
+                    self.last_id = row_id
+
+    def find_matches(self, p: int, d: int) -> List[Dict[str, int]]:
+        """Earlier photos whose pHash and dHash are both within the match radii."""
+        self.refresh()
+        matches = []
+        with self._lock:
+            for row_id, distance in self.index.search(p, self.phash_radius):
+                submission_id, filename, other_d = self.rows[row_id]
+                d_distance = hamming(d, other_d)
+                if d_distance <= self.dhash_radius:
+                    matches.append({"submission_id": submission_id, "filename": filename,
+                                    "phash_distance": distance, "dhash_distance": d_distance})
+        return matches
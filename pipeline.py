@@ -0,0 +1,62 @@
+"""Lightweight handles on the verification pipeline for the web tier.
+
+Importing verification.py pulls in OpenCV, scikit-learn, Tesseract and the
+inference backends. The web process only needs to name the pipeline's
+entry points, so it uses the lazy references here: they import their
+module on first call (in a worker process, or on a thread when
+``VERIFY_WORKERS=0``) and pickle by name, so handing one to a worker
+never imports the pipeline in the parent. ``STAGE_IMPORTS`` lists the
+heavy modules stages import on first use, for workers to load up front.
+"""
+from typing import Any, Dict, Tuple
+import importlib
+import config
+from instrumentation import StageTimer, STAGE_SECONDS
+
+# Bump whenever a change alters verification results; stored results from
+# another version are not reused. Cascade results skip checks, so they are
+# kept apart from full runs. 2: mean depth of the native MiDaS output.
+# 3: results carry their per-check outcomes ("checks") for rescoring.
+# 4: the cascade always records EXIF locations, even for decided photos.
+PIPELINE_VERSION = "4" + ("-cascade" if config.VERIFY_CASCADE else "")
+
+# Wall time per verify_photos stage in this process, also fed to /metrics
+stage_timer = StageTimer(STAGE_SECONDS)
+
+# Modules imported by a stage the first time it runs (model frameworks are
+# imported by backends.py when the models load)
+STAGE_IMPORTS: Dict[str, Tuple[str, ...]] = {
+    "clustering": ("sklearn.cluster",),
+}
+
+
+class LazyFunction:
+    """``module.name``, imported on first call."""
+
+    def __init__(self, module: str, name: str):
+        self.module = module
+        self.name = name
+        self._function = None
+
+    def __call__(self, *args, **kwargs) -> Any:
+        if self._function is None:
+            self._function = getattr(importlib.import_module(self.module), self.name)
+        return self._function(*args, **kwargs)
+
+    def __getstate__(self):
+        return {"module": self.module, "name": self.name, "_function": None}
+
+    def __repr__(self) -> str:
+        return f"<lazy {self.module}.{self.name}>"
+
+
+def preload(stages=None):
+    """Import the modules behind ``stages`` (default: all) ahead of their first use."""
+    for stage in stages or STAGE_IMPORTS:
+        for module in STAGE_IMPORTS.get(stage, ()):
+            importlib.import_module(module)
+
+
+verify_submission = LazyFunction("verification", "verify_submission")
+rescore_submission = LazyFunction("verification", "rescore_submission")
+init_models = LazyFunction("verification", "init_models")
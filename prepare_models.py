@@ -0,0 +1,160 @@
+"""Download model weights once and store them for offline loading.
+
+Run this on a machine with network access, then copy the model directory
+to nodes without it:
+
+    python prepare_models.py [--model-dir models]
+
+verification.py only ever loads from this directory. For the ONNX Runtime
+backend (INFERENCE_BACKEND=onnx), export and int8-quantize the saved models,
+then check them against the reference backends:
+
+    python prepare_models.py --onnx --calibration-dir uploads
+    python prepare_models.py --check --calibration-dir uploads
+"""
+from typing import List, Tuple
+import argparse
+import os
+import sys
+import numpy as np
+import config
+
+SCENE_MODEL_URL = "https://tfhub.dev/google/imagenet/efficientnet_v2_imagenet1k_b0/feature_vector/2"
+
+
+def prepare_midas(model_dir: str):
+    """Fetch MiDaS_small through torch.hub and save it as a TorchScript module."""
+    import torch
+    midas = torch.hub.load("intel-isl/MiDaS", "MiDaS_small")
+    midas.eval()
+    example = torch.zeros(1, 3, 256, 256)
+    with torch.no_grad():
+        traced = torch.jit.trace(midas, example)
+    path = os.path.join(model_dir, config.MIDAS_ARTIFACT)
+    traced.save(path)
+    print(f"Saved MiDaS to {path}")
+
+
+def prepare_scene_model(model_dir: str):
+    """Build the EfficientNet scene model from TF Hub and save it as a SavedModel."""
+    import tensorflow as tf
+    import tensorflow_hub as hub
+    base_model = hub.KerasLayer(SCENE_MODEL_URL, trainable=False)
+    scene_model = tf.keras.Sequential([
+        tf.keras.layers.InputLayer(input_shape=(224, 224, 3)),
+        base_model,
+        tf.keras.layers.Dense(1024, activation='relu'),
+        tf.keras.layers.Dense(512, activation='relu'),
+        tf.keras.layers.Dense(2, activation='linear')  # lat, lon prediction
+    ])
+    module = tf.Module()
+    module.model = scene_model
+    module.forward = tf.function(
+        lambda batch: scene_model(batch, training=False),
+        input_signature=[tf.TensorSpec([None, 224, 224, 3], tf.float32)])
+    path = os.path.join(model_dir, config.SCENE_ARTIFACT)
+    tf.saved_model.save(module, path)
+    print(f"Saved scene model to {path}")
+
+
+def sample_inputs(directory: str, limit: int) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """Preprocessed depth and scene inputs (one image each) from sample photos."""
+    from image_context import ImageContext
+    from verification import midas_transform
+    depth_inputs, scene_inputs = [], []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            try:
+                ctx = ImageContext(os.path.join(root, name))
+                depth_inputs.append(midas_transform(ctx.resized_rgb(384))[None])
+                scene_inputs.append(ctx.resized_rgb(224).astype(np.float32)[None])
+            except Exception:
+                continue  # Not an image
+            if len(depth_inputs) >= limit:
+                return depth_inputs, scene_inputs
+    return depth_inputs, scene_inputs
+
+
+def export_onnx(model_dir: str, calibration_dir: str, quantize: bool, limit: int):
+    """Export both models to ONNX and, with ``quantize``, calibrate int8 copies."""
+    import backends
+    from verification import MIDAS_INPUT_SIZE
+    depth_path = backends.export_depth(model_dir, MIDAS_INPUT_SIZE)
+    scene_path = backends.export_scene(model_dir)
+    print(f"Exported {depth_path} and {scene_path}")
+    if quantize:
+        depth_inputs, scene_inputs = sample_inputs(calibration_dir, limit)
+        if not depth_inputs:
+            sys.exit(f"No calibration images found in {calibration_dir}")
+        for path, name, inputs in ((depth_path, backends.DEPTH_INPUT, depth_inputs),
+                                   (scene_path, backends.SCENE_INPUT, scene_inputs)):
+            print(f"Quantized {backends.quantize(path, name, inputs)} "
+                  f"({len(inputs)} calibration images)")
+
+
+def check_parity(model_dir: str, sample_dir: str, quantized: bool, limit: int,
+                 depth_tolerance: float, scene_tolerance: float) -> bool:
+    """Compare the ONNX backends with the reference ones on sample photos.
+
+    Depth is compared relatively (mean depth per photo), scene predictions
+    in absolute degrees.
+    """
+    import backends
+    depth_inputs, scene_inputs = sample_inputs(sample_dir, limit)
+    if not depth_inputs:
+        sys.exit(f"No sample images found in {sample_dir}")
+    reference = backends.load_depth("reference", model_dir=model_dir)
+    candidate = backends.load_depth("onnx", quantized, model_dir)
+    depth_ref = [float(reference.predict(batch)[0].mean()) for batch in depth_inputs]
+    depth_onnx = [float(candidate.predict(batch)[0].mean()) for batch in depth_inputs]
+    reference = backends.load_scene("reference", model_dir=model_dir)
+    candidate = backends.load_scene("onnx", quantized, model_dir)
+    scene_ref = np.concatenate([reference.predict(batch) for batch in scene_inputs])
+    scene_onnx = np.concatenate([candidate.predict(batch) for batch in scene_inputs])
+
+    _, depth_rel = backends.parity(depth_ref, depth_onnx)
+    scene_abs, _ = backends.parity(scene_ref, scene_onnx)
+    label = "int8" if quantized else "fp32"
+    print(f"{len(depth_inputs)} photos, ONNX {label} vs reference:")
+    print(f"  depth: max relative difference {depth_rel:.4f} (tolerance {depth_tolerance})")
+    print(f"  scene: max difference {scene_abs:.4f} degrees (tolerance {scene_tolerance})")
+    return depth_rel <= depth_tolerance and scene_abs <= scene_tolerance
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model-dir", default=config.MODEL_DIR)
+    parser.add_argument("--only", choices=["midas", "scene"])
+    parser.add_argument("--onnx", action="store_true",
+                        help="Export the saved models to ONNX (and int8) instead of downloading")
+    parser.add_argument("--no-quantize", action="store_true", help="With --onnx, skip int8 graphs")
+    parser.add_argument("--check", action="store_true",
+                        help="Compare the ONNX graphs with the reference backends and exit")
+    parser.add_argument("--fp32", action="store_true", help="With --check, test the fp32 graphs")
+    parser.add_argument("--calibration-dir", default="uploads",
+                        help="Sample photos for int8 calibration and parity checks")
+    parser.add_argument("--samples", type=int, default=64, help="Sample photos to use at most")
+    parser.add_argument("--depth-tolerance", type=float, default=0.05,
+                        help="Allowed relative difference in mean depth")
+    parser.add_argument("--scene-tolerance", type=float, default=0.5,
+                        help="Allowed difference in predicted lat/lon, in degrees")
+    args = parser.parse_args()
+
+    if args.check:
+        ok = check_parity(args.model_dir, args.calibration_dir, not args.fp32, args.samples,
+                          args.depth_tolerance, args.scene_tolerance)
+        print("Parity OK" if ok else "Parity check FAILED")
+        sys.exit(0 if ok else 1)
+    if args.onnx:
+        export_onnx(args.model_dir, args.calibration_dir, not args.no_quantize, args.samples)
+        return
+
+    os.makedirs(args.model_dir, exist_ok=True)
+    if args.only in (None, "midas"):
+        prepare_midas(args.model_dir)
+    if args.only in (None, "scene"):
+        prepare_scene_model(args.model_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+from starlette.requests import Request
+try:
+    import python_multipart as multipart
+    from python_multipart.multipart import parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    import multipart
+    from multipart.multipart import parse_options_header
+import config
+import database
+
+# Room in a multipart body for boundaries and part headers around the files
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the configured size limit."""
+
+
+class InvalidUpload(Exception):
+    """Raised when a request body is not a usable multipart upload."""
+
+
+class _UploadPart:
+    """One file part of a multipart body, hashed as it is written to a temporary file."""
+
+    def __init__(self, upload_dir: str, filename: str, max_bytes: int):
+        self.upload_dir = upload_dir
+        self.filename = filename
+        self.created = False
+        self.max_bytes = max_bytes
+        self.digest = hashlib.sha256()
+        self.size = 0
+        fd, self.temp_path = tempfile.mkstemp(dir=upload_dir, suffix=".part")
+        self.out = os.fdopen(fd, "wb")
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"{self.filename} is larger than {self.max_bytes // (1024 * 1024)} MB")
+        self.digest.update(data)
+        self.out.write(data)
+
+    def finish(self) -> Tuple[str, str]:
+        """Move the file to ``<upload_dir>/<sha[:2]>/<sha><ext>``; returns ``(path, sha256)``.
+
+        ``created`` records whether no earlier upload had stored the same file.
+        """
+        self.out.close()
+        sha256 = self.digest.hexdigest()
+        ext = os.path.splitext(self.filename)[1].lower()
+        if not re.fullmatch(r"\.[a-z0-9]{1,5}", ext):
+            ext = ".jpg"
+        path = os.path.join(self.upload_dir, sha256[:2], sha256 + ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.created = not os.path.exists(path)
+        os.replace(self.temp_path, path)
+        return path, sha256
+
+    def discard(self):
+        self.out.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+async def save_multipart(request: Request, upload_dir: str, max_bytes: int,
+                         min_files: int, max_files: int) -> Tuple[List[str], List[str], List[str]]:
+    """Stream the file parts of a ``multipart/form-data`` request to content-addressed storage.
+
+    The body is parsed as it arrives, so nothing is spooled first: each file
+    is written in the chunks the client sends while its SHA-256 is computed,
+    then renamed to ``<upload_dir>/<sha[:2]>/<sha><ext>``. Identical uploads
+    share one file and different uploads never collide, whatever their client
+    filenames. A Content-Length over ``max_files`` files of ``max_bytes`` is
+    refused before any of the body is read, and a file over ``max_bytes`` or
+    more than ``max_files`` files stop the transfer at that point, keeping no
+    partial file. File inputs left empty (an empty filename) are ignored.
+    When the upload is rejected, including for fewer than ``min_files``
+    files, the files it stored are removed again, except those an earlier
+    upload had already stored. Returns the saved paths, their hashes and the
+    client filenames.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise InvalidUpload("Expected a multipart/form-data upload.")
+    body_limit = max_files * max_bytes + MULTIPART_OVERHEAD
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > body_limit:
+        raise UploadTooLarge(f"Upload is larger than {body_limit // (1024 * 1024)} MB")
+
+    os.makedirs(upload_dir, exist_ok=True)
+    count_error = f"Please upload {min_files}-{max_files} photos per board."
+    created: List[str] = []
+    saved_paths: List[str] = []
+    hashes: List[str] = []
+    names: List[str] = []
+    header_field = bytearray()
+    header_value = bytearray()
+    headers: Dict[bytes, bytes] = {}
+    part: Optional[_UploadPart] = None
+
+    def on_part_begin():
+        headers.clear()
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished():
+        nonlocal part
+        _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+        name = os.path.basename(disposition.get(b"filename", b"").decode("utf-8", "replace"))
+        # Plain form fields and file inputs left empty carry no filename
+        if not name:
+            return
+        if len(names) >= max_files:
+            raise InvalidUpload(count_error)
+        part = _UploadPart(upload_dir, name, max_bytes)
+
+    def on_part_data(data: bytes, start: int, end: int):
+        if part is not None:
+            part.write(data[start:end])
+
+    def on_part_end():
+        nonlocal part
+        if part is None:
+            return
+        path, sha256 = part.finish()
+        if part.created:
+            created.append(path)
+        saved_paths.append(path)
+        hashes.append(sha256)
+        names.append(part.filename)
+        part = None
+
+    parser = multipart.MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    try:
+        received = 0
+        async for chunk in request.stream():
+            # Chunked bodies carry no Content-Length to check up front
+            received += len(chunk)
+            if received > body_limit:
+                raise UploadTooLarge(f"Upload is larger than {body_limit // (1024 * 1024)} MB")
+            parser.write(chunk)
+        parser.finalize()
+        if len(saved_paths) < min_files:
+            raise InvalidUpload(count_error)
+    except BaseException as e:
+        if part is not None:
+            part.discard()
+        for path in set(created):
+            if os.path.exists(path):
+                os.remove(path)
+        if isinstance(e, multipart.exceptions.MultipartParseError):
+            raise InvalidUpload(f"Malformed upload: {e}") from e
+        raise
+    return saved_paths, hashes, names
+
+
+def submission_key(hashes: List[str]) -> str:
+    """Order-independent key for a set of photos."""
+    return hashlib.sha256("\n".join(sorted(hashes)).encode()).hexdigest()
+
+
+def json_default(value: Any):
+    """``json.dumps`` hook for the datetimes in verification results."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def store_cached_results(conn: sqlite3.Connection, key: str, pipeline_version: str,
+                         results: List[Dict[str, Any]]):
+    """Remember a submission's results on an open connection."""
+    conn.execute("INSERT OR REPLACE INTO verification_cache (submission_key, pipeline_version, results) "
+                 "VALUES (?, ?, ?)", (key, pipeline_version, json.dumps(results, default=json_default)))
+
+
+def load_cached_results(db_path: str, key: str, pipeline_version: str,
+                        hashes: List[str], names: List[str]) -> Optional[List[Dict[str, Any]]]:
+    """Results recorded for the same photos and pipeline version, if any.
+
+    Results come back in the order of ``hashes`` and carry the current
+    client filenames.
+    """
+    with database.connection(db_path) as conn:
+        row = conn.execute("SELECT results FROM verification_cache WHERE submission_key = ? "
+                           "AND pipeline_version = ?", (key, pipeline_version)).fetchone()
+    if row is None:
+        return None
+    by_hash = {}
+    for result in json.loads(row[0]):
+        timestamp = result["metadata"].get("timestamp")
+        if timestamp:
+            result["metadata"]["timestamp"] = datetime.fromisoformat(timestamp)
+        by_hash.setdefault(result.get("sha256"), []).append(result)
+    results = []
+    for sha256, name in zip(hashes, names):
+        if not by_hash.get(sha256):
+            return None
+        result = dict(by_hash[sha256].pop(0))
+        result["file"] = name
+        results.append(result)
+    return results
+
+
+def write_results(conn: sqlite3.Connection, verification_results: List[Dict[str, Any]],
+                  key: Optional[str] = None, pipeline_version: Optional[str] = None):
+    """Insert one row per verified photo, plus its perceptual hashes and location,
+    on a connection inside ``database.transaction()``.
+
+    With a submission ``key`` and ``pipeline_version``, the results are also
+    kept for reuse unless a photo failed to process.
+    """
+    # Imported here to keep OpenCV and NumPy out of the web tier's startup
+    from photo_hashes import store_photo_hashes
+    from geo_index import GeoIndex, store_geo_points
+    # Clusters new at verification time get their persistent ids in this
+    # transaction, next to the points that define them
+    located = [r for r in verification_results
+               if r["metadata"]["lat"] is not None and r["metadata"]["lon"] is not None]
+    geo_index = GeoIndex(None, config.GEO_CLUSTER_RADIUS_M, config.GEOHASH_PRECISION)
+    clusters = geo_index.resolve_clusters(
+        conn, [(r["metadata"]["lat"], r["metadata"]["lon"]) for r in located],
+        [r["cluster"] for r in located])
+    for result, cluster in zip(located, clusters):
+        result["cluster"] = cluster
+    rows = []
+    for result in verification_results:
+        metadata = result["metadata"]
+        rows.append((result["file"], result["status"], result["score"],
+                     ", ".join(result["reason"]),
+                     metadata["lat"], metadata["lon"],
+                     metadata["timestamp"].isoformat() if metadata["timestamp"] else None,
+                     metadata["device"], result["depth"], result["cluster"]))
+    ids = database.insert_submissions(conn, rows)
+    hash_rows = []
+    geo_rows = []
+    for submission_id, result in zip(ids, verification_results):
+        result["submission_id"] = submission_id
+        metadata = result["metadata"]
+        if result.get("phash") is not None:
+            hash_rows.append((submission_id, result["file"], result["phash"], result["dhash"]))
+        if metadata["lat"] is not None and metadata["lon"] is not None and result["cluster"] >= 0:
+            geo_rows.append((submission_id, metadata["lat"], metadata["lon"], result["cluster"]))
+    store_photo_hashes(conn, hash_rows)
+    store_geo_points(conn, geo_rows, config.GEOHASH_PRECISION)
+    if (key is not None and pipeline_version is not None
+            and all(r["status"] != "Error" for r in verification_results)):
+        store_cached_results(conn, key, pipeline_version, verification_results)
+
+
+def store_results(verification_results: List[Dict[str, Any]], key: Optional[str] = None,
+                  pipeline_version: Optional[str] = None, db_path: Optional[str] = None):
+    """Write one submission's results in a single transaction."""
+    with database.transaction(db_path) as conn:
+        write_results(conn, verification_results, key, pipeline_version)
@@ -0,0 +1,81 @@
+"""Oracles and generated inputs shared by the tests and benchmark.py's checks."""
+from typing import Any, Dict, List, Tuple
+from datetime import datetime, timedelta
+import cv2
+import numpy as np
+
+
+def reference_score_clusters(results: List[Dict[str, Any]]):
+    """The pairwise cluster analysis score_clusters replaced, kept as its oracle."""
+    for result in results:
+        if result["status"] is not None:
+            continue
+        cluster_photos = [r for r in results if r["cluster"] == result["cluster"]]
+        reasons = result["reason"]
+        if len(cluster_photos) > 2:
+            result["score"] *= 0.6
+            reasons.append("Excessive photos in same location cluster")
+        for other in cluster_photos:
+            if other["file"] != result["file"] and None not in (result["depth"], other["depth"]):
+                if abs(result["depth"] - other["depth"]) < 2.0:
+                    result["score"] *= 0.7
+                    reasons.append("Similar photo depth in cluster")
+        for other in cluster_photos:
+            if (other["file"] != result["file"] and
+                    other["metadata"]["timestamp"] and result["metadata"]["timestamp"]):
+                time_diff = abs((other["metadata"]["timestamp"] -
+                                 result["metadata"]["timestamp"]).total_seconds())
+                if time_diff < 15:
+                    result["score"] *= 0.6
+                    reasons.append("Photos taken too quickly")
+        same_device_count = sum(1 for r in cluster_photos
+                                if r["metadata"]["device"] == result["metadata"]["device"])
+        if same_device_count > 2:
+            result["score"] *= 0.7
+            reasons.append("Multiple submissions from same device")
+        result["score"] = max(0.0, min(1.0, result["score"]))
+        result["status"] = "Rejected" if result["score"] < 0.5 else (
+            "Suspicious" if result["score"] < 0.7 else "Verified")
+
+
+def random_batch(rng: np.random.Generator, n: int, clusters: int) -> List[Dict[str, Any]]:
+    """Unscored results crowded with ties, exact-threshold gaps and duplicate names."""
+    start = datetime(2025, 9, 14, 13, 0, 0)
+    base_depths = [0.0, 0.1, 0.3, 2.0, 2.1, 2.3, 4.1, 100.0, 101.99999999999999, 1e-300]
+    results = []
+    for i in range(n):
+        error = rng.random() < 0.05
+        depth = None if rng.random() < 0.1 else float(rng.choice(base_depths)) + float(rng.choice([0, 0, rng.normal(0, 3)]))
+        seconds = float(rng.choice([0, 14, 15, 29, 30, 45, rng.uniform(0, 120)]))
+        timestamp = None if rng.random() < 0.2 else start + timedelta(
+            seconds=seconds, microseconds=int(rng.choice([0, 1, 999999])))
+        results.append({
+            "file": f"photo_{rng.integers(0, max(1, n * 3 // 4))}.jpg",
+            "status": "Error" if error else None,
+            "score": 0.0 if error else float(rng.choice([1.0, 0.9, 0.72, 0.5, rng.random()])),
+            "reason": [],
+            "metadata": {"lat": None, "lon": None, "timestamp": None if error else timestamp,
+                         "device": None if error else rng.choice([None, "Pixel 7", "SM-G991B"])},
+            "depth": 0.0 if error else depth,
+            "cluster": -1 if error else int(rng.integers(-1, clusters)),
+        })
+    return results
+
+
+def whole_image_ela(img: np.ndarray, qualities: Tuple[int, ...],
+                    block_size: int = 32) -> Tuple[np.ndarray, np.ndarray]:
+    """Whole-image ELA means and block means, the oracle for tiling.error_level_analysis."""
+    h, w = img.shape[:2]
+    block_size = max(1, min(block_size, h, w))
+    rows, cols = h // block_size, w // block_size
+    means = np.empty(len(qualities))
+    blocks = np.empty((len(qualities), rows, cols), dtype=np.float32)
+    for i, quality in enumerate(qualities):
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        assert ok
+        diff = cv2.absdiff(img, cv2.imdecode(buf, cv2.IMREAD_COLOR))
+        means[i] = np.mean(diff)
+        cropped = diff[:rows * block_size, :cols * block_size]
+        blocks[i] = cropped.reshape(rows, block_size, cols, block_size, -1).mean(
+            axis=(1, 3, 4), dtype=np.float32)
+    return means, blocks
@@ -0,0 +1,19 @@
+"""The web process must start quickly and without the pipeline's heavy dependencies."""
+import benchmark
+
+# Generous next to benchmark.py --import-budget's 1 s default, to allow slow CI machines
+IMPORT_BUDGET_SECONDS = 3.0
+
+
+def test_app_import_is_light():
+    # Fresh interpreters, so nothing imported by other tests counts
+    seconds, loaded = benchmark.measure_import("app", runs=3)
+    assert not set(loaded) & set(benchmark.HEAVY_MODULES), loaded
+    assert seconds < IMPORT_BUDGET_SECONDS
+
+
+def test_storing_results_leaves_opencv_unloaded():
+    # storage.write_results runs in the web process and imports these
+    for module in ("photo_hashes", "geo_index"):
+        _, loaded = benchmark.measure_import(module, runs=1)
+        assert "cv2" not in loaded and "verification" not in loaded, (module, loaded)
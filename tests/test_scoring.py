@@ -0,0 +1,39 @@
+"""score_clusters against the pairwise cluster analysis it replaced."""
+import copy
+import numpy as np
+import pytest
+import verification
+from tests.reference import random_batch, reference_score_clusters
+
+
+def outcomes(results):
+    return [(r["file"], r["score"], r["status"], r["reason"]) for r in results]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_pairwise_reference(seed):
+    # Batches full of ties, exact-threshold gaps, duplicate names and errors
+    rng = np.random.default_rng(seed)
+    for _ in range(60):
+        batch = random_batch(rng, int(rng.integers(1, 80)), int(rng.integers(1, 6)))
+        expected, actual = copy.deepcopy(batch), copy.deepcopy(batch)
+        reference_score_clusters(expected)
+        verification.score_clusters(actual)
+        assert outcomes(actual) == outcomes(expected)
+
+
+def test_matches_pairwise_reference_on_large_batch():
+    batch = random_batch(np.random.default_rng(42), 2000, 3)
+    expected, actual = copy.deepcopy(batch), copy.deepcopy(batch)
+    reference_score_clusters(expected)
+    verification.score_clusters(actual)
+    assert outcomes(actual) == outcomes(expected)
+
+
+def test_scored_results_are_left_alone():
+    batch = random_batch(np.random.default_rng(7), 20, 1)
+    for result in batch:
+        result["status"] = "Verified"
+    before = copy.deepcopy(batch)
+    verification.score_clusters(batch)
+    assert batch == before
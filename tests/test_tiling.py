@@ -0,0 +1,48 @@
+"""Striped ELA and noise statistics against the whole-image computations."""
+import cv2
+import numpy as np
+import pytest
+import tiling
+from tests.reference import whole_image_ela
+
+QUALITIES = (75, 90, 95)
+# From one JPEG MCU row up to more than the whole image
+STRIPE_ROWS = (16, 48, 500, 4096)
+
+
+def board_photo(height, width):
+    """Smooth gradient with sharp-edged shapes and text, like a board on a wall."""
+    y, x = np.mgrid[0:height, 0:width]
+    img = np.dstack([(x * 255 // width), (y * 255 // height), ((x + y) % 256)]).astype(np.uint8)
+    for k in range(6):
+        top, left = height * k // 7, width * k // 7
+        cv2.rectangle(img, (left, top), (left + width // 5, top + height // 9), (20 * k, 200, 40), -1)
+        cv2.putText(img, f"BOARD {k}", (left, top + height // 12), cv2.FONT_HERSHEY_SIMPLEX,
+                    max(0.3, width / 800), (255, 255, 255), 2)
+    return img
+
+
+IMAGES = {
+    "board": board_photo(1203, 1601),
+    "noise": np.random.default_rng(0).integers(0, 256, (1001, 777, 3), dtype=np.uint8),
+    "tiny": np.random.default_rng(1).integers(0, 256, (7, 9, 3), dtype=np.uint8),
+}
+
+
+@pytest.mark.parametrize("name", IMAGES)
+@pytest.mark.parametrize("rows", STRIPE_ROWS)
+def test_ela_matches_whole_image(name, rows):
+    img = IMAGES[name]
+    means, blocks = whole_image_ela(img, QUALITIES)
+    striped_means, striped_blocks = tiling.error_level_analysis(img, QUALITIES, stripe_rows=rows)
+    np.testing.assert_array_equal(striped_means, means)
+    np.testing.assert_array_equal(striped_blocks, blocks)
+
+
+@pytest.mark.parametrize("name", IMAGES)
+@pytest.mark.parametrize("rows", STRIPE_ROWS)
+def test_laplacian_variance_matches_whole_image(name, rows):
+    gray = cv2.cvtColor(IMAGES[name], cv2.COLOR_BGR2GRAY)
+    variance = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    striped = tiling.laplacian_variance(gray, rows)
+    assert abs(striped - variance) <= tiling.VARIANCE_RTOL * max(variance, 1.0)
@@ -0,0 +1,120 @@
+"""Image statistics computed a horizontal stripe at a time.
+
+Whole-image ELA holds a recompressed copy and a difference image the size
+of the photo, and a float64 Laplacian costs 8 bytes per pixel: several
+hundred MB on a 50 MP photo. These versions work on stripes of
+``stripe_rows`` rows plus a few halo rows of context, so their scratch
+memory depends on the stripe size and not on the image height.
+
+Each stripe's halo covers every pixel its kept rows depend on, so the
+per-pixel values are the whole-image values. ELA stripes and halos are
+aligned to JPEG's 16-row MCUs (and to the ELA block size), so each kept
+row is encoded and decoded from the same blocks and chroma neighbours as
+in the whole image. The difference sums are exact integers, so
+``error_level_analysis`` returns the whole-image means and block means.
+``laplacian_variance`` merges per-stripe moments with Chan's parallel
+formula. It agrees with ``cv2.Laplacian(gray, cv2.CV_64F).var()``
+to within ``VARIANCE_RTOL`` relative error; only the float64 summation
+order differs.
+"""
+from typing import Iterator, Tuple
+import math
+import cv2
+import numpy as np
+
+# Rows per JPEG MCU with 4:2:0 chroma subsampling (OpenCV's default)
+JPEG_MCU_ROWS = 16
+# Agreement of laplacian_variance with the whole-image variance
+VARIANCE_RTOL = 1e-9
+
+
+class RunningStats:
+    """Count, mean and sum of squared deviations, merged chunk by chunk (Chan et al.)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, values: np.ndarray):
+        """Merge the moments of a chunk of float values."""
+        count = values.size
+        if count == 0:
+            return
+        mean, std = cv2.meanStdDev(values.reshape(-1, 1))
+        self.merge(count, float(mean[0, 0]), float(std[0, 0]) ** 2 * count)
+
+    def merge(self, count: int, mean: float, m2: float):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    @property
+    def variance(self) -> float:
+        """Population variance, as ``np.var`` computes it."""
+        return self.m2 / self.count if self.count else 0.0
+
+
+def stripes(height: int, stripe_rows: int, halo: int, align: int = 1
+            ) -> Iterator[Tuple[int, int, int, int]]:
+    """``(start, stop, keep_start, keep_stop)`` row ranges covering ``height``.
+
+    Rows ``keep_start:keep_stop`` are this stripe's own; ``start:stop``
+    adds up to ``halo`` rows on either side. Boundaries and halos are
+    multiples of ``align``.
+    """
+    stripe_rows = max(align, stripe_rows // align * align)
+    halo = -(-halo // align) * align
+    for keep_start in range(0, height, stripe_rows):
+        keep_stop = min(keep_start + stripe_rows, height)
+        yield max(0, keep_start - halo), min(height, keep_stop + halo), keep_start, keep_stop
+
+
+def error_level_analysis(img: np.ndarray, qualities: Tuple[int, ...] = (90,),
+                         block_size: int = 32, stripe_rows: int = 512
+                         ) -> Tuple[np.ndarray, np.ndarray]:
+    """Error Level Analysis at one or more JPEG qualities.
+
+    Returns ``(means, blocks)``: the global mean absolute difference for each
+    quality, and an array of shape ``(len(qualities), rows, cols)`` with the
+    mean difference of every ``block_size`` x ``block_size`` block. Pixels past
+    the last whole block on the right and bottom edges are left out of
+    ``blocks`` but included in ``means``.
+    """
+    h, w = img.shape[:2]
+    block_size = max(1, min(block_size, h, w))
+    rows, cols = h // block_size, w // block_size
+    totals = [0] * len(qualities)
+    blocks = np.empty((len(qualities), rows, cols), dtype=np.float32)
+    # Stripes hold whole blocks and whole MCUs; one MCU of halo covers the
+    # decoder's chroma upsampling across MCU rows
+    align = math.lcm(JPEG_MCU_ROWS, block_size)
+    for start, stop, keep_start, keep_stop in stripes(h, stripe_rows, JPEG_MCU_ROWS, align):
+        stripe = img[start:stop]
+        kept = slice(keep_start - start, keep_stop - start)
+        first, last = keep_start // block_size, min(keep_stop // block_size, rows)
+        for i, quality in enumerate(qualities):
+            ok, buf = cv2.imencode(".jpg", stripe, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if not ok:
+                raise ValueError("JPEG encoding failed")
+            diff = cv2.absdiff(stripe[kept], cv2.imdecode(buf, cv2.IMREAD_COLOR)[kept])
+            totals[i] += int(diff.sum(dtype=np.int64))
+            if last > first:
+                cropped = diff[:(last - first) * block_size, :cols * block_size]
+                blocks[i, first:last] = cropped.reshape(last - first, block_size, cols, block_size, -1).mean(
+                    axis=(1, 3, 4), dtype=np.float32)
+    return np.array(totals, dtype=np.float64) / img.size, blocks
+
+
+def laplacian_variance(gray: np.ndarray, stripe_rows: int) -> float:
+    """Variance of the 3x3 Laplacian of a grayscale image."""
+    stats = RunningStats()
+    # The kernel reaches one row each way; the image's own edges are reflected
+    # exactly as whole-image filtering reflects them
+    for start, stop, keep_start, keep_stop in stripes(gray.shape[0], stripe_rows, 1):
+        # Laplacian values of 8-bit input are small integers, exact in float32
+        lap = cv2.Laplacian(gray[start:stop], cv2.CV_32F)
+        stats.add(lap[keep_start - start:keep_stop - start])
+    return stats.variance
@@ -1,53 +1,110 @@
-from typing import List, Tuple, Dict, Any, Optional
+from typing import Callable, List, Tuple, Dict, Any, Optional
 import numpy as np
-import torch
 import cv2
-from PIL import Image
 from exif import Image as ExifImage
-from sklearn.cluster import DBSCAN
-from haversine import haversine
-import folium
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import copy
 import os
-import tensorflow as tf
-import tensorflow_hub as hub
-import geopy
-from geopy.geocoders import Nominatim
 import logging
+import time
 import pytesseract
+from collections import defaultdict
+from concurrent.futures import Future
+from image_context import ImageContext
+from ocr_cache import OCRCache
+from depth_store import DepthStore, depth_features
+from ocr_engine import OCREngine
+from photo_hashes import PhotoHashIndex, phash, dhash
+from geo_index import GeoIndex, provisional_id
+from geocoding import Geocoder, GeocodeCache, Gazetteer, RemoteGeocoder
+from batching import MicroBatcher
+from tiling import error_level_analysis, laplacian_variance
+import backends
+from instrumentation import STAGE_ERRORS, CACHE_LOOKUPS, counter, trace
+from pipeline import PIPELINE_VERSION, stage_timer, preload
+import config
 
 # Set Tesseract executable path 
 pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
-# Initialize model variables
+logger = logging.getLogger(__name__)
+
+PHOTOS_VERIFIED = counter("verification_photos_total", "Photos verified, by final status", ["status"])
+
+# Inference backends (see backends.py), loaded on first use
 scene_model = None
 midas = None
-transform = None
 
-def preprocess_image_for_ocr(image_path: str) -> str:
-    """Preprocess image for better OCR results."""
-    img = cv2.imread(image_path)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+# MiDaS_small input normalization (ImageNet statistics)
+MIDAS_INPUT_SIZE = 256
+MIDAS_MEAN = np.array([0.485, 0.456, 0.406])
+MIDAS_STD = np.array([0.229, 0.224, 0.225])
+
+def preprocess_image_for_ocr(ctx: ImageContext) -> np.ndarray:
+    """Preprocess image for better OCR results (binarized, in memory)."""
+    gray = cv2.threshold(ctx.gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
     kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3,3))
     gray = cv2.dilate(gray, kernel, iterations=1)
-    temp_path = "temp_processed.png"
-    cv2.imwrite(temp_path, gray)
-    return temp_path
+    return gray
+
+# Equivalent to r'--oem 3 --psm 6 -c preserve_interword_spaces=1'
+ocr_engine = OCREngine(config.OCR_POOL_SIZE, psm=6, oem=3,
+                       variables={"preserve_interword_spaces": "1"})
+
+ocr_cache = OCRCache(config.OCR_CACHE_PATH, config.OCR_CACHE_MEMORY_ENTRIES,
+                     config.OCR_CACHE_MAX_BYTES)
 
-def detect_location_from_text(image_path: str) -> Tuple[float, float, float, str]:
+# Profiles from different depth models never mix
+depth_store = DepthStore(config.DEPTH_STORE_DIR, backends.depth_signature())
+
+geocoder = Geocoder(
+    GeocodeCache(config.GEOCODE_CACHE_PATH),
+    Gazetteer(config.GAZETTEER_PATH) if os.path.exists(config.GAZETTEER_PATH) else None,
+    RemoteGeocoder(min_interval=config.GEOCODER_MIN_INTERVAL,
+                   max_pending=config.GEOCODER_MAX_PENDING)
+    if config.GEOCODER_REMOTE == "nominatim" else None,
+    config.GEOCODER_REMOTE_TIMEOUT)
+
+# pHash index over every stored photo, for reuse across submissions
+hash_index = PhotoHashIndex(config.DATABASE_PATH, config.PHASH_RADIUS, config.DHASH_RADIUS)
+
+def find_reuse(photo_phash: int, photo_dhash: int) -> List[Dict[str, Any]]:
+    """Earlier submissions' photos matching these hashes."""
+    try:
+        return hash_index.find_matches(photo_phash, photo_dhash)
+    except Exception as e:
+        STAGE_ERRORS.inc("reuse")
+        logger.warning(f"Photo hash lookup error: {e}")
+        return []
+
+def check_photo_reuse(ctx: ImageContext) -> Tuple[int, int, List[Dict[str, Any]]]:
+    """Hash the photo and look it up against all earlier submissions."""
+    photo_phash, photo_dhash = phash(ctx.gray), dhash(ctx.gray)
+    return photo_phash, photo_dhash, find_reuse(photo_phash, photo_dhash)
+
+def run_ocr(ctx: ImageContext) -> Dict[str, Any]:
+    """OCR a photo, at most once per image content and OCR config.
+
+    Returns the recognized text plus per-word boxes and confidences, and
+    this call's ``latency_ms`` and whether it was ``cached``.
+    """
+    start = time.perf_counter()
+    with stage_timer.stage("ocr"):
+        key = OCRCache.key(ctx.sha256, ocr_engine.signature)
+        result = ocr_cache.get(key)
+        cached = result is not None
+        CACHE_LOOKUPS.inc("ocr", "hit" if cached else "miss")
+        if not cached:
+            # Preprocess image for better OCR, then OCR only the text regions
+            result = ocr_engine.recognize(preprocess_image_for_ocr(ctx))
+            ocr_cache.put(key, result)
+    # Per-call stats stay out of the cached entry, so a hit reports its own
+    return {**result, "latency_ms": (time.perf_counter() - start) * 1000, "cached": cached}
+
+def detect_location_from_text(ctx: ImageContext) -> Tuple[float, float, float, str]:
     """Extract location information from text in the image."""
     try:
-        # Preprocess image for better OCR
-        processed_image = preprocess_image_for_ocr(image_path)
-        img = Image.open(processed_image)
-        
-        # Perform OCR with custom configuration
-        custom_config = r'--oem 3 --psm 6 -c preserve_interword_spaces=1'
-        text = pytesseract.image_to_string(img, config=custom_config)
-        
-        # Clean up temporary file
-        os.remove(processed_image)
+        text = run_ocr(ctx)["text"]
         
         # Look for coordinates in the text
         coordinates_found = False
@@ -71,73 +128,77 @@ def detect_location_from_text(image_path: str) -> Tuple[float, float, float, str
             # Look for address information
             elif any(keyword in line.lower() for keyword in ['street', 'road', 'avenue', 'building', 'city', 'state', 'pin']):
                 location_text = line
-                # Use geopy to convert address to coordinates if no direct coordinates found
+                # Geocode the address (cache, gazetteer, then remote) if no direct coordinates found
                 if not coordinates_found:
-                    try:
-                        geolocator = Nominatim(user_agent="board_verification")
-                        location = geolocator.geocode(line)
-                        if location:
-                            lat = location.latitude
-                            lon = location.longitude
-                            coordinates_found = True
-                            confidence = 0.7  # Lower confidence for geocoded addresses
-                    except Exception as e:
-                        print(f"Geocoding error: {e}")
+                    with stage_timer.stage("geocode"):
+                        location = geocoder.geocode(line)
+                    if location:
+                        # Lower confidence for geocoded addresses
+                        lat, lon, confidence = location
+                        coordinates_found = True
         
         return lat, lon, confidence, location_text
         
     except Exception as e:
-        print(f"OCR processing error: {e}")
+        STAGE_ERRORS.inc("ocr")
+        logger.warning(f"OCR processing error: {e}")
         return None, None, 0.0, ""
 
 def init_scene_model():
-    """Initialize scene recognition model lazily on first use"""
+    """Load the scene recognition model from the local artifact directory"""
     global scene_model
     if scene_model is None:
         try:
-            # Load EfficientNet model for scene recognition
-            model_url = "https://tfhub.dev/google/imagenet/efficientnet_v2_imagenet1k_b0/feature_vector/2"
-            base_model = hub.KerasLayer(model_url, trainable=False)
-            scene_model = tf.keras.Sequential([
-                tf.keras.layers.InputLayer(input_shape=(224, 224, 3)),
-                base_model,
-                tf.keras.layers.Dense(1024, activation='relu'),
-                tf.keras.layers.Dense(512, activation='relu'),
-                tf.keras.layers.Dense(2, activation='linear')  # lat, lon prediction
-            ])
+            # EfficientNet scene model saved (or exported) by prepare_models.py
+            scene_model = backends.load_scene()
         except Exception as e:
-            logging.error(f"Error loading location detection model: {e}")
+            logger.error(f"Error loading location detection model from {config.MODEL_DIR} "
+                          f"(run prepare_models.py first): {e}")
             raise
 
-def analyze_image_authenticity(image_path: str) -> Tuple[float, List[str]]:
+def predict_locations(images: List[np.ndarray]) -> List[Tuple[float, float]]:
+    """Run the scene model once over a batch of 224x224 RGB images."""
+    init_scene_model()  # Initialize model if needed
+    predictions = scene_model.predict(np.stack(images).astype(np.float32))
+    return [(float(lat), float(lon)) for lat, lon in predictions]
+
+# Shared by every photo verified in this process (see MicroBatcher on what that spans)
+scene_batcher = MicroBatcher(predict_locations, config.SCENE_BATCH_SIZE, name="scene-batcher")
+
+def submit_scenes(contexts: List[ImageContext]) -> List[Future]:
+    """Queue photos for the scene model together, so they share a batch."""
+    return scene_batcher.submit_many([ctx.resized_rgb(224) for ctx in contexts])
+
+def jpeg_roundtrip(img: np.ndarray, quality: int) -> np.ndarray:
+    """Recompress an image as JPEG at ``quality`` entirely in memory."""
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+def analyze_image_authenticity(ctx: ImageContext) -> Tuple[float, List[str]]:
     """Analyze image for signs of manipulation."""
     try:
-        img = cv2.imread(image_path)
+        img = ctx.image
         authenticity_score = 1.0
         reasons = []
         
         # Check 1: Error Level Analysis (ELA)
-        temp_path = "temp_ela.jpg"
-        cv2.imwrite(temp_path, img, [cv2.IMWRITE_JPEG_QUALITY, 90])
-        ela_img = cv2.imread(temp_path)
-        os.remove(temp_path)
-        
-        diff = cv2.absdiff(img, ela_img)
-        ela_score = np.mean(diff)
+        with stage_timer.stage("ela"):
+            ela_means, _ = error_level_analysis(img, (90,), stripe_rows=config.STRIPE_ROWS)
+            ela_score = ela_means[0]
         if ela_score > 50:  # Threshold determined empirically
             authenticity_score *= 0.7
             reasons.append("High error level analysis score suggests possible manipulation")
         
         # Check 2: Metadata consistency
-        img_pil = Image.open(image_path)
-        exif = img_pil._getexif() if hasattr(img_pil, '_getexif') else None
-        if not exif:
+        if not ctx.has_exif:
             authenticity_score *= 0.9
             reasons.append("No EXIF metadata found")
         
         # Check 3: Image quality and noise analysis 
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        noise_score = cv2.Laplacian(gray, cv2.CV_64F).var()
+        with stage_timer.stage("noise"):
+            noise_score = laplacian_variance(ctx.gray, config.STRIPE_ROWS)
         if noise_score < 100:  # Very low noise might indicate artificial images
             authenticity_score *= 0.8
             reasons.append("Unusually low image noise levels detected")
@@ -145,48 +206,89 @@ def analyze_image_authenticity(image_path: str) -> Tuple[float, List[str]]:
         return authenticity_score, reasons
         
     except Exception as e:
-        print(f"Image authenticity analysis error: {e}")
+        STAGE_ERRORS.inc("authenticity")
+        logger.warning(f"Image authenticity analysis error: {e}")
         return 0.5, ["Error during authenticity analysis"]
 
-def compute_depth(image_path: str):
-    """Estimate camera-to-board distance using MiDaS."""
+def midas_transform(img: np.ndarray) -> np.ndarray:
+    """MiDaS_small input transform: resize, normalize and convert to CHW."""
+    img = cv2.resize(img / 255.0, (MIDAS_INPUT_SIZE, MIDAS_INPUT_SIZE),
+                     interpolation=cv2.INTER_CUBIC)
+    img = (img - MIDAS_MEAN) / MIDAS_STD
+    return np.ascontiguousarray(img.transpose(2, 0, 1)).astype(np.float32)
+
+def _midas_forward(images: List[np.ndarray]) -> np.ndarray:
+    """Run one MiDaS forward pass over a batch of 384x384 RGB images.
+
+    Returns the depth maps at the model's output resolution.
+    """
+    # Initialize model if needed
+    if midas is None:
+        init_midas()
+
+    input_batch = np.stack([midas_transform(img) for img in images])
+    return midas.predict(input_batch)
+
+# Shared by every photo verified in this process (see MicroBatcher on what that spans)
+depth_batcher = MicroBatcher(_midas_forward, config.DEPTH_BATCH_SIZE, name="midas-batcher")
+
+def submit_depth(ctx: ImageContext) -> Future:
+    """Queue a photo for batched MiDaS inference, unless its profile is stored.
+
+    The future resolves to a stored ``(mean, profile)`` pair or a fresh depth map.
+    """
     try:
-        # Initialize model if needed
-        if midas is None:
-            init_midas()
-            
-        img = cv2.imread(image_path)
-        if img is None:
-            raise ValueError("Unable to read image")
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        img = cv2.resize(img, (384, 384))
-        input_batch = transform(img).to('cpu')
-        with torch.no_grad():
-            depth = midas(input_batch)
-            depth = torch.nn.functional.interpolate(
-                depth.unsqueeze(1), size=img.shape[:2], mode="bicubic",
-                align_corners=False
-            ).squeeze()
-        return float(depth.mean().item())
+        stored = depth_store.get(ctx.sha256)
     except Exception as e:
-        print(f"Error computing depth: {str(e)}")
+        STAGE_ERRORS.inc("depth_store")
+        logger.warning(f"Depth store read error: {e}")
+        stored = None
+    if stored is not None:
+        CACHE_LOOKUPS.inc("depth", "hit")
+        done = Future()
+        done.set_result(stored)
+        return done
+    CACHE_LOOKUPS.inc("depth", "miss")
+    return depth_batcher.submit(ctx.resized_rgb(384))
+
+def compute_depth(ctx: ImageContext, pending: Optional[Future] = None):
+    """Estimate camera-to-board distance using MiDaS.
+
+    Fresh depth maps are reduced to a profile (depth_store.depth_features)
+    and stored by photo hash; the exact mean is returned.
+    """
+    try:
+        if pending is None:
+            pending = submit_depth(ctx)
+        output = pending.result()
+        if isinstance(output, tuple):
+            return output[0]
+        features = depth_features(output)
+        try:
+            depth_store.put(ctx.sha256, features)
+        except Exception as e:
+            STAGE_ERRORS.inc("depth_store")
+            logger.warning(f"Depth store write error: {e}")
+        return float(features[0])
+    except Exception as e:
+        STAGE_ERRORS.inc("depth")
+        logger.warning(f"Error computing depth: {str(e)}")
         return 0.0  # Safe default depth
 
-def extract_exif_metadata(image_path: str):
+def extract_exif_metadata(ctx: ImageContext):
     """Extract geolocation, timestamp, and device from EXIF."""
     try:
-        with open(image_path, "rb") as img_file:
-            img = ExifImage(img_file)
-            lat = img.get("gps_latitude", None)
-            lon = img.get("gps_longitude", None)
-            timestamp = img.get("datetime", None)
-            device = img.get("model", None)
-            if lat and lon:
-                lat = float(lat[0]) + lat[1]/60 + lat[2]/3600
-                lon = float(lon[0]) + lon[1]/60 + lon[2]/3600
-            if timestamp:
-                timestamp = datetime.strptime(timestamp, "%Y:%m:%d %H:%M:%S")
-            return {"lat": lat, "lon": lon, "timestamp": timestamp, "device": device}
+        img = ExifImage(ctx.data)
+        lat = img.get("gps_latitude", None)
+        lon = img.get("gps_longitude", None)
+        timestamp = img.get("datetime", None)
+        device = img.get("model", None)
+        if lat and lon:
+            lat = float(lat[0]) + lat[1]/60 + lat[2]/3600
+            lon = float(lon[0]) + lon[1]/60 + lon[2]/3600
+        if timestamp:
+            timestamp = datetime.strptime(timestamp, "%Y:%m:%d %H:%M:%S")
+        return {"lat": lat, "lon": lon, "timestamp": timestamp, "device": device}
     except:
         return {"lat": None, "lon": None, "timestamp": None, "device": None}
 
@@ -194,257 +296,613 @@ def cluster_geolocations(locations: List[tuple]):
     """Cluster geolocations using DBSCAN."""
     if not locations:
         return []
+    from sklearn.cluster import DBSCAN  # Slow to import; see pipeline.STAGE_IMPORTS
     db = DBSCAN(eps=10/6371e3, min_samples=1, metric="haversine").fit(np.radians(locations))
     return db.labels_
 
-def detect_location_from_image(image_path: str) -> Tuple[float, float]:
-    """Detect approximate location from image using multiple methods."""
-    print(f"Attempting to detect location from image: {image_path}")
+# Geohash grid over every stored location, shared with all earlier submissions
+geo_index = GeoIndex(config.DATABASE_PATH, config.GEO_CLUSTER_RADIUS_M, config.GEOHASH_PRECISION)
+
+def link_historical_clusters(locations: List[tuple], labels) -> Tuple[List[int], List[int]]:
+    """Replace per-request cluster labels with persistent cluster ids.
+
+    Returns the cluster id and the number of earlier photos nearby for each
+    location. Clusters new to the index get provisional ids, resolved when
+    the results are stored; if the index is unavailable, every cluster does.
+    """
+    try:
+        return geo_index.assign_clusters(locations, [int(l) for l in labels])
+    except Exception as e:
+        STAGE_ERRORS.inc("clustering")
+        logger.warning(f"Geo index error: {e}")
+        return [provisional_id(int(l)) for l in labels], [0] * len(locations)
+
+def detect_location_from_image(ctx: ImageContext,
+                               text_location: Optional[Tuple[float, float, float, str]] = None,
+                               scene: Optional[Future] = None) -> Tuple[float, float]:
+    """Detect approximate location from image using multiple methods.
+
+    ``text_location`` is a result already returned by detect_location_from_text
+    for this photo; passing it avoids repeating OCR and geocoding. ``scene``
+    is the photo's queued scene-model prediction (see submit_scenes).
+    """
+    logger.debug(f"Attempting to detect location from image: {ctx.name}")
     
     # Method 1: Try OCR detection
-    ocr_lat, ocr_lon, ocr_confidence, location_text = detect_location_from_text(image_path)
+    if text_location is None:
+        text_location = detect_location_from_text(ctx)
+    ocr_lat, ocr_lon, ocr_confidence, location_text = text_location
     
     if ocr_lat and ocr_lon and ocr_confidence > 0.7:
         return ocr_lat, ocr_lon
         
     # Method 2: Try visual feature detection
     try:
-        init_scene_model()  # Initialize model if needed
-        img = tf.keras.preprocessing.image.load_img(image_path, target_size=(224, 224))
-        img_array = tf.keras.preprocessing.image.img_to_array(img)
-        img_array = tf.expand_dims(img_array, 0)
-        img_array = tf.keras.applications.efficientnet_v2.preprocess_input(img_array)
-        
-        predictions = scene_model.predict(img_array)
-        detected_lat, detected_lon = predictions[0]
+        with stage_timer.stage("scene_model"):
+            if scene is None:
+                scene = submit_scenes([ctx])[0]
+            detected_lat, detected_lon = scene.result()
         
         # Validate predictions are within reasonable ranges
         if -90 <= detected_lat <= 90 and -180 <= detected_lon <= 180:
             return detected_lat, detected_lon
     except Exception as e:
-        print(f"Visual detection error: {e}")
+        STAGE_ERRORS.inc("scene_model")
+        logger.warning(f"Visual detection error: {e}")
     
     return None, None
 
 def init_midas():
-    """Initialize MiDaS model lazily on first use"""
-    global midas, transform
+    """Load the MiDaS model from the local artifact directory"""
+    global midas
     if midas is None:
         try:
-            midas = torch.hub.load("intel-isl/MiDaS", "MiDaS_small")
-            midas.eval()
-            transform = torch.hub.load("intel-isl/MiDaS", "transforms").small_transform
+            midas = backends.load_depth()
         except Exception as e:
-            print(f"Error loading MiDaS model: {str(e)}")
+            logger.error(f"Error loading MiDaS model from {config.MODEL_DIR} "
+                         f"(run prepare_models.py first): {str(e)}")
             raise
 
-def verify_photos(file_paths: List[str]) -> Tuple[List[Dict[str, Any]], List[Dict[str, str]]]:
+def warm_up_models():
+    """Run one dummy inference through each model so the first request is not slow."""
+    _midas_forward([np.zeros((384, 384, 3), dtype=np.uint8)])
+    predict_locations([np.zeros((224, 224, 3), dtype=np.uint8)])
+
+def init_models():
+    """Load and warm every model up front, e.g. when a worker process starts."""
+    init_midas()
+    init_scene_model()
+    warm_up_models()
+    ocr_engine.start()
+    preload()
+
+# Checks the cascade can order and skip, and the smallest factor each can
+# still multiply a photo's score by. Depth only acts through the cluster
+# comparisons, which are covered by group_worst_factor().
+CASCADE_STAGES = ("reuse", "authenticity", "location", "depth")
+# Stages that read the full-resolution pixels (depth only needs its 384x384 input)
+FULL_RESOLUTION_STAGES = ("reuse", "authenticity", "location")
+STAGE_WORST_FACTOR = {"reuse": 0.5, "authenticity": 0.5, "location": 0.5, "depth": 1.0}
+# Spans timed for each check, used to order them when CASCADE_ORDER=auto
+CASCADE_STAGE_SPANS = {"reuse": ("reuse",), "authenticity": ("ela", "noise"),
+                       "location": ("ocr", "geocode", "scene_model"), "depth": ("depth",)}
+# Order in which per-check reasons are reported, whatever order they ran in
+REASON_ORDER = ("location", "authenticity", "reuse", "clustering")
+# Checks whose outcome depends on earlier submissions; rerun when stored results are reused
+HISTORY_STAGES = ("reuse", "clustering")
+STAGES_SKIPPED = counter("verification_stages_skipped_total",
+                         "Checks skipped by the cascade because the verdict was decided", ["stage"])
+
+def status_band(score: float) -> str:
+    """Status for a final score."""
+    if score < 0.5:
+        return "Rejected"
+    if score < 0.7:
+        return "Suspicious"
+    return "Verified"
+
+def group_worst_factor(photos: int) -> float:
+    """Smallest product the cluster analysis can apply with ``photos`` in a submission."""
+    others = max(0, photos - 1)
+    factor = 0.7 ** others * 0.6 ** others  # Similar depth and quick timing, per other photo
+    if photos > 2:
+        factor *= 0.6 * 0.7  # Crowded cluster, repeated device
+    return factor
+
+def cascade_order() -> List[str]:
+    """Checks in the configured order; depth always runs after location."""
+    if config.CASCADE_ORDER == "auto":
+        seconds, calls = stage_timer.snapshot(), stage_timer.calls()
+        cost = {stage: sum(seconds[s] / calls[s] for s in spans if calls.get(s))
+                for stage, spans in CASCADE_STAGE_SPANS.items()}
+        if all(cost.values()):
+            order = sorted(CASCADE_STAGES, key=cost.get)
+        else:
+            order = list(CASCADE_STAGES)  # Not measured yet
+    else:
+        order = [s.strip() for s in config.CASCADE_ORDER.split(",") if s.strip() in CASCADE_STAGES]
+        order += [s for s in CASCADE_STAGES if s not in order]
+    # Depth is only skippable per cluster, so clusters must be known first
+    if order.index("depth") < order.index("location"):
+        order.remove("depth")
+        order.insert(order.index("location") + 1, "depth")
+    return order
+
+def verdict_decided(score: float, remaining: List[str], photos: int) -> bool:
+    """Whether the checks in ``remaining`` and the cluster analysis can no longer
+    change the status band of a photo scored ``score`` so far.
+
+    Every factor is at most 1, so a score can only fall; the band is settled
+    once the worst case lands in the same band.
+    """
+    if config.CASCADE_EXIT == "rejected":
+        return score < 0.5
+    worst = score * group_worst_factor(photos)
+    for stage in remaining:
+        worst *= STAGE_WORST_FACTOR[stage]
+    return status_band(score) == status_band(worst)
+
+def locate_photo(ctx: ImageContext, result: Dict[str, Any],
+                 scene: Optional[Future] = None) -> Tuple[float, List[str]]:
+    """Find a photo's location from EXIF GPS, text on the photo or the scene model.
+
+    Fills in the result's coordinates, confidence and method; returns the
+    score factor and reasons. ``scene`` is passed on to detect_location_from_image.
+    """
+    metadata = result["metadata"]
+    location_methods_tried = []
+    location_confidence = 0.0
+    text_location = None
+
+    # Method 1: Try EXIF GPS data
+    if metadata["lat"] is not None and metadata["lon"] is not None:
+        location_methods_tried.append("EXIF GPS data")
+        location_confidence = 1.0  # Highest confidence for EXIF data
+
+    # Method 2: Try OCR to detect location from text
+    if not location_methods_tried:
+        try:
+            text_location = detect_location_from_text(ctx)
+            lat, lon, conf, location_text = text_location
+            if lat is not None and lon is not None:
+                metadata["lat"] = lat
+                metadata["lon"] = lon
+                location_methods_tried.append("Text detection")
+                location_confidence = conf  # Set location confidence from OCR
+        except Exception as e:
+            STAGE_ERRORS.inc("ocr")
+            logger.warning(f"OCR detection failed: {str(e)}")
+
+    # Method 3: Try visual feature detection
+    if not location_methods_tried:
+        detected_lat, detected_lon = detect_location_from_image(ctx, text_location, scene)
+        if detected_lat is not None and detected_lon is not None:
+            metadata["lat"] = detected_lat
+            metadata["lon"] = detected_lon
+            location_methods_tried.append("Visual detection")
+            location_confidence = 0.5  # Lower confidence for ML detection
+
+    result["location_confidence"] = location_confidence
+    result["location_method"] = "; ".join(location_methods_tried) if location_methods_tried else "None"
+    if location_methods_tried:
+        return 1.0, [f"Location detected using: {', '.join(location_methods_tried)}"]
+    return 0.5, ["Could not detect location from image"]  # Significant penalty for no location
+
+def check_reuse(ctx: ImageContext, result: Dict[str, Any]) -> Tuple[float, List[str]]:
+    """Check for reuse of a photo from an earlier submission."""
+    with stage_timer.stage("reuse"):
+        result["phash"], result["dhash"], reuse_matches = check_photo_reuse(ctx)
+    return reuse_outcome(reuse_matches)
+
+def reuse_outcome(matches: List[Dict[str, Any]]) -> Tuple[float, List[str]]:
+    if matches:
+        match = matches[0]
+        return 0.5, [f"Photo matches earlier submission #{match['submission_id']} "
+                     f"({match['filename']})"]
+    return 1.0, []
+
+def cluster_results(results: List[Dict[str, Any]], stage_reasons: List[Dict[str, List[str]]]):
+    """Assign each located photo its persistent cluster id."""
+    located = [i for i, r in enumerate(results)
+               if r["metadata"]["lat"] is not None and r["metadata"]["lon"] is not None]
+    if not located:
+        return
+    locations = [(results[i]["metadata"]["lat"], results[i]["metadata"]["lon"]) for i in located]
+    with stage_timer.stage("clustering"):
+        clusters = cluster_geolocations(locations)
+        clusters, earlier_counts = link_historical_clusters(locations, clusters)
+    for i, cluster, earlier in zip(located, clusters, earlier_counts):
+        results[i]["cluster"] = int(cluster)
+        if earlier:
+            stage_reasons[i]["clustering"] = [
+                f"Location matches {earlier} earlier photo(s) in cluster #{int(cluster)}"]
+
+EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+def _codes(values: List[Any]) -> np.ndarray:
+    """Integer code per value, equal codes for equal values (None included)."""
+    codes: Dict[Any, int] = {}
+    return np.array([codes.setdefault(v, len(codes)) for v in values], dtype=np.int64)
+
+def _epoch_microseconds(timestamp: datetime) -> int:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (timestamp - EPOCH) // ONE_MICROSECOND
+
+def count_close(groups: np.ndarray, values: np.ndarray, radius) -> np.ndarray:
+    """For each element, how many elements of its group (itself included)
+    satisfy ``abs(value - other) < radius``.
+
+    Values are ranked, then each element's window of ranks is found by
+    binary search on a (group, rank) sort: O(n log n) instead of comparing
+    every pair. Window edges are re-checked with the comparison itself, so
+    float rounding at the boundary counts exactly as a pairwise loop would.
+    """
+    if not len(values):
+        return np.zeros(0, dtype=np.int64)
+    uniq, value_rank = np.unique(values, return_inverse=True)
+    _, group_rank = np.unique(groups, return_inverse=True)
+    width = len(uniq) + 1
+    keys = group_rank.astype(np.int64) * width
+    combined = np.sort(keys + value_rank)
+    last = len(uniq) - 1
+
+    def close(rank: np.ndarray) -> np.ndarray:
+        return np.abs(values - uniq[np.clip(rank, 0, last)]) < radius
+
+    # First rank inside the window: widen, then narrow, past rounding at the edge
+    lo = np.searchsorted(uniq, values - radius, "right")
+    while True:
+        move = (lo > 0) & close(lo - 1)
+        if not move.any():
+            break
+        lo[move] -= 1
+    while True:
+        move = (lo <= last) & ~close(lo) & (uniq[np.clip(lo, 0, last)] <= values)
+        if not move.any():
+            break
+        lo[move] += 1
+    # First rank past the window
+    hi = np.searchsorted(uniq, values + radius, "left")
+    while True:
+        move = (hi <= last) & close(hi)
+        if not move.any():
+            break
+        hi[move] += 1
+    while True:
+        move = (hi > 0) & ~close(hi - 1) & (uniq[np.clip(hi - 1, 0, last)] >= values)
+        if not move.any():
+            break
+        hi[move] -= 1
+    return np.searchsorted(combined, keys + hi, "left") - np.searchsorted(combined, keys + lo, "left")
+
+def _multiply_repeatedly(scores: np.ndarray, counts: np.ndarray, factor: float):
+    """``scores[i] *= factor`` ``counts[i]`` times, rounding after every step
+    like the equivalent loop; stops early once a score reaches zero."""
+    active = np.flatnonzero(counts)
+    step = 0
+    while active.size:
+        scores[active] *= factor
+        step += 1
+        active = active[(counts[active] > step) & (scores[active] != 0.0)]
+
+def score_clusters(results: List[Dict[str, Any]]):
+    """Apply the cluster-level checks to every unscored result and set its status.
+
+    Each photo is compared with every other photo in its cluster (error
+    results included, photos sharing its filename excluded from the pairwise
+    checks); each close depth and each close timestamp costs one penalty.
+    The comparisons run over columnar arrays, so a batch of n photos takes
+    O(n log n) rather than O(n^2) Python steps.
+    """
+    n = len(results)
+    pending = np.array([r["status"] is None for r in results], dtype=bool)
+    if not pending.any():
+        return
+    clusters = np.array([r["cluster"] for r in results], dtype=np.int64)
+    files = _codes([r["file"] for r in results])
+    devices = _codes([r["metadata"]["device"] for r in results])
+    # Each photo pairs with the same-named ones too; subtracting those leaves "others"
+    cluster_files = clusters * (int(files.max()) + 1) + files
+
+    # Check for too many photos in same location
+    _, cluster_index, cluster_sizes = np.unique(clusters, return_inverse=True, return_counts=True)
+    crowded = cluster_sizes[cluster_index] > 2
+
+    # Check for similar depths in cluster (never skipped unless both verdicts are decided)
+    similar_depth = np.zeros(n, dtype=np.int64)
+    has_depth = np.array([r["depth"] is not None for r in results], dtype=bool)
+    if has_depth.any():
+        depths = np.array([r["depth"] for r in results if r["depth"] is not None], dtype=np.float64)
+        similar_depth[has_depth] = (count_close(clusters[has_depth], depths, 2.0)
+                                    - count_close(cluster_files[has_depth], depths, 2.0))
+
+    # Check for suspicious timing: integer microseconds, as timedelta.total_seconds() counts
+    too_quick = np.zeros(n, dtype=np.int64)
+    has_time = np.array([bool(r["metadata"]["timestamp"]) for r in results], dtype=bool)
+    if has_time.any():
+        times = np.array([_epoch_microseconds(r["metadata"]["timestamp"])
+                          for r in results if r["metadata"]["timestamp"]], dtype=np.int64)
+        too_quick[has_time] = (count_close(clusters[has_time], times, 15_000_000)
+                               - count_close(cluster_files[has_time], times, 15_000_000))
+
+    # Check for multiple submissions from same device
+    _, device_index, device_sizes = np.unique(clusters * (int(devices.max()) + 1) + devices,
+                                              return_inverse=True, return_counts=True)
+    same_device = device_sizes[device_index] > 2
+
+    # Penalties in the order they have always been applied, for identical rounding
+    scores = np.array([r["score"] for r in results], dtype=np.float64)
+    scores[pending & crowded] *= 0.6
+    _multiply_repeatedly(scores, np.where(pending, similar_depth, 0), 0.7)
+    _multiply_repeatedly(scores, np.where(pending, too_quick, 0), 0.6)
+    scores[pending & same_device] *= 0.7
+
+    for i in np.flatnonzero(pending):
+        result = results[i]
+        reasons = result["reason"]
+        if crowded[i]:
+            reasons.append("Excessive photos in same location cluster")
+        reasons.extend(["Similar photo depth in cluster"] * int(similar_depth[i]))
+        reasons.extend(["Photos taken too quickly"] * int(too_quick[i]))
+        if same_device[i]:
+            reasons.append("Multiple submissions from same device")
+        # Set final status based on score
+        result["score"] = max(0.0, min(1.0, float(scores[i])))  # Clamp between 0 and 1
+        result["status"] = status_band(result["score"])
+
+def _error_result(name: str, error: Exception) -> Dict[str, Any]:
+    return {
+        "file": name,
+        "status": "Error",
+        "score": 0.0,
+        "reason": [f"Processing error: {str(error)}"],
+        "metadata": {"lat": None, "lon": None, "timestamp": None, "device": None},
+        "depth": 0.0,
+        "cluster": -1,
+        "location_confidence": 0.0,
+        "location_method": "None"
+    }
+
+def verify_photos(file_paths: List[str], names: Optional[List[str]] = None,
+                  progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
     """Verify photos for fraud detection using automatic location detection.
-    
+
+    Checks run one at a time across the whole submission. With
+    ``VERIFY_CASCADE`` they run in cost order and a photo skips the checks
+    that can no longer change its status band (listed in its
+    ``skipped_stages``); location and depth also feed the other photos'
+    cluster analysis, so they are only skipped where no undecided photo
+    depends on them. Each photo's full-resolution pixels are dropped after
+    the last check that reads them, so only the small model inputs are
+    held for the depth and cluster stages.
+
     Args:
         file_paths: List of paths to photos
+        names: Filenames to report for each photo (defaults to the path basenames)
+        progress: Called with a ``stage`` event as each check finishes across
+            the submission, and a ``photo`` event with each photo's result
+            as soon as its last check finishes (or it fails), before the
+            cluster analysis
     Returns:
-        Tuple[List[Dict], List[Dict[str, str]]]: List of results and list of map URLs with names
+        List[Dict]: One result per photo; maps are drawn from the stored coordinates
     """
-    results = []
-    locations = []
-    map_urls = []
-    timestamps = []
-    devices = []
-    individual_maps = []
-
-    # Process each photo
-    for file_path in file_paths:
-        try:
-            # Initialize variables
-            score = 1.0
-            reasons = []
-            has_location = False
-            location_methods_tried = []
-            location_confidence = 0.0  # Initialize confidence score
-            
-            # Extract metadata
-            metadata = extract_exif_metadata(file_path)
-            
-            # Compute depth first as it doesn't depend on metadata
-            depth = compute_depth(file_path)
-            
-            # Method 1: Try EXIF GPS data
-            if metadata["lat"] is not None and metadata["lon"] is not None:
-                locations.append((metadata["lat"], metadata["lon"]))
-                has_location = True
-                location_methods_tried.append("EXIF GPS data")
-                location_confidence = 1.0  # Highest confidence for EXIF data
-
-            # Method 2: Try OCR to detect location from text
-            if not has_location:
+    names = names or [os.path.basename(path) for path in file_paths]
+    cascade = config.VERIFY_CASCADE
+    order = cascade_order()
+    last_full_resolution = max(order.index(stage) for stage in FULL_RESOLUTION_STAGES)
+    results: List[Dict[str, Any]] = [None] * len(file_paths)
+    contexts = [None] * len(file_paths)
+    depth_jobs = [None] * len(file_paths)
+    factors = [{} for _ in file_paths]
+    stage_reasons = [{} for _ in file_paths]
+
+    def emit(i: int):
+        if progress is not None:
+            # A copy: the cluster analysis goes on appending to the reasons
+            progress({"event": "photo", "result": copy.deepcopy(results[i])})
+
+    def fail(i: int, e: Exception):
+        # Handle file-level errors gracefully
+        STAGE_ERRORS.inc("photo")
+        logger.warning(f"Processing error for {names[i]}: {e}")
+        results[i] = _error_result(names[i], e)
+        if contexts[i] is not None:
+            contexts[i].release()
+        emit(i)
+
+    def decided(i: int, remaining: List[str]) -> bool:
+        score = 1.0
+        for factor in factors[i].values():
+            score *= factor
+        return verdict_decided(score, remaining, len(results))
+
+    def skip(i: int, stage: str):
+        results[i]["skipped_stages"].append(stage)
+        STAGES_SKIPPED.inc(stage)
+
+    try:
+        # Decode every photo once. Outside the cascade every photo needs depth,
+        # so it is queued up front and MiDaS sees the whole submission (and
+        # concurrent ones) in one batch while the other checks run.
+        for i, file_path in enumerate(file_paths):
+            try:
+                with stage_timer.stage("decode"):
+                    contexts[i] = ImageContext(file_path)
+                if not cascade:
+                    depth_jobs[i] = submit_depth(contexts[i])
+                with stage_timer.stage("exif"):
+                    metadata = extract_exif_metadata(contexts[i])
+                results[i] = {
+                    "file": names[i],
+                    "sha256": contexts[i].sha256,
+                    "status": None,  # Will be set later
+                    "score": 1.0,
+                    "reason": [],
+                    "metadata": metadata,
+                    "depth": None,
+                    "cluster": -1,  # Will be updated if geolocation exists
+                    "location_confidence": 0.0,
+                    "location_method": "None",
+                    "skipped_stages": []
+                }
+            except Exception as e:
+                fail(i, e)
+
+        for position, stage in enumerate(order):
+            remaining = order[position:]
+            pending = [i for i, r in enumerate(results) if r["status"] is None]
+            if not cascade:
+                needed = pending
+            elif stage == "location":
+                # Any photo's location can put it in another's cluster; EXIF
+                # coordinates cost nothing to read, so they are always recorded
+                needed = pending if not all(decided(i, remaining) for i in pending) else [
+                    i for i in pending if results[i]["metadata"]["lat"] is not None
+                    and results[i]["metadata"]["lon"] is not None]
+            elif stage == "depth":
+                # Depth is only compared within a cluster with an undecided photo
+                undecided_clusters = {results[i]["cluster"] for i in pending
+                                      if not decided(i, remaining)}
+                sizes = defaultdict(int)
+                for r in results:
+                    sizes[r["cluster"]] += 1
+                needed = [i for i in pending if results[i]["cluster"] in undecided_clusters
+                          and sizes[results[i]["cluster"]] > 1]
+            else:
+                needed = [i for i in pending if not decided(i, remaining)]
+
+            scene_jobs = {}
+            if stage == "location":
+                # Photos without EXIF GPS may fall back to the scene model; queue
+                # them all now so they share one batch instead of one each
+                unlocated = [i for i in needed if results[i]["metadata"]["lat"] is None
+                             or results[i]["metadata"]["lon"] is None]
+                try:
+                    scene_jobs = dict(zip(unlocated, submit_scenes([contexts[i] for i in unlocated])))
+                except Exception:
+                    pass  # detect_location_from_image retries and reports it
+            if stage == "depth" and cascade:
+                # Queue the whole batch before waiting on any of it
+                for i in needed:
+                    try:
+                        depth_jobs[i] = submit_depth(contexts[i])
+                    except Exception:
+                        pass  # compute_depth retries and reports it
+            for i in pending:
                 try:
-                    lat, lon, conf, location_text = detect_location_from_text(file_path)
-                    if lat is not None and lon is not None:
-                        metadata["lat"] = lat
-                        metadata["lon"] = lon
-                        locations.append((lat, lon))
-                        has_location = True
-                        location_methods_tried.append("Text detection")
-                        location_confidence = conf  # Set location confidence from OCR
+                    if i not in needed:
+                        if stage == "reuse":
+                            # Still hash the photo so later submissions can match it
+                            gray = contexts[i].gray
+                            results[i]["phash"], results[i]["dhash"] = phash(gray), dhash(gray)
+                        skip(i, stage)
+                    else:
+                        if stage == "location":
+                            factor, reasons = locate_photo(contexts[i], results[i], scene_jobs.get(i))
+                        elif stage == "authenticity":
+                            factor, reasons = analyze_image_authenticity(contexts[i])
+                        elif stage == "reuse":
+                            factor, reasons = check_reuse(contexts[i], results[i])
+                        else:
+                            with stage_timer.stage("depth"):
+                                results[i]["depth"] = compute_depth(contexts[i], depth_jobs[i])
+                            factor, reasons = 1.0, []
+                        factors[i][stage] = factor
+                        stage_reasons[i][stage] = reasons
                 except Exception as e:
-                    print(f"OCR detection failed: {str(e)}")
-
-            # Method 3: Try visual feature detection
-            if not has_location:
-                detected_lat, detected_lon = detect_location_from_image(file_path)
-                if detected_lat is not None and detected_lon is not None:
-                    metadata["lat"] = detected_lat
-                    metadata["lon"] = detected_lon
-                    locations.append((detected_lat, detected_lon))
-                    has_location = True
-                    location_methods_tried.append("Visual detection")
-                    location_confidence = 0.5  # Lower confidence for ML detection
-            
-            # Update result based on location detection
-            if has_location:
-                reasons.append(f"Location detected using: {', '.join(location_methods_tried)}")
-            else:
-                reasons.append("Could not detect location from image")
-                score *= 0.5  # Significant penalty for no location
-                location_confidence = 0.0  # No location confidence if no location found
-                
-            # Store data for later analysis
-            if metadata["timestamp"]:
-                timestamps.append(metadata["timestamp"])
-            if metadata["device"]:
-                devices.append(metadata["device"])
-
-            # Analyze image authenticity
-            authenticity_score, authenticity_reasons = analyze_image_authenticity(file_path)
-            score *= authenticity_score
-            reasons.extend(authenticity_reasons)
-
-            # Create result
-            result = {
-                "file": os.path.basename(file_path),
-                "status": None,  # Will be set later
-                "score": score,
-                "reason": reasons,
-                "metadata": metadata,
-                "depth": depth,
-                "cluster": -1,  # Will be updated if geolocation exists
-                "location_confidence": location_confidence,
-                "location_method": "; ".join(location_methods_tried) if location_methods_tried else "None"
-            }
-            results.append(result)
-            
-        except Exception as e:
-            # Handle file-level errors gracefully
-            results.append({
-                "file": os.path.basename(file_path),
-                "status": "Error",
-                "score": 0.0,
-                "reason": [f"Processing error: {str(e)}"],
-                "metadata": {"lat": None, "lon": None, "timestamp": None, "device": None},
-                "depth": 0.0,
-                "cluster": -1,
-                "location_confidence": 0.0,
-                "location_method": "None"
-            })
-
-    # Cluster geolocations if we have any
-    if locations:
-        clusters = cluster_geolocations(locations)
-        loc_index = 0
-        for result in results:
-            if result["metadata"]["lat"] is not None and result["metadata"]["lon"] is not None:
-                if loc_index < len(clusters):
-                    result["cluster"] = int(clusters[loc_index])
-                loc_index += 1
+                    fail(i, e)
+                    continue
+                if position == last_full_resolution:
+                    if cascade and results[i]["status"] is None:
+                        contexts[i].resized_rgb(384)  # Depth input, in case depth runs
+                    contexts[i].release_full_resolution()
+                if position == len(order) - 1:
+                    # Depth runs after location, so the clusters are already known
+                    assemble_result(results[i], factors[i], stage_reasons[i])
+                    emit(i)
+            if stage == "location":
+                cluster_results(results, stage_reasons)
+            if progress is not None:
+                progress({"event": "stage", "stage": stage, "done": position + 1, "stages": len(order)})
+    finally:
+        for ctx in contexts:
+            if ctx is not None:
+                ctx.release()
+
+    finish_results(results)
+    return results
+
+def assemble_result(result: Dict[str, Any], factors: Dict[str, float], reasons: Dict[str, List[str]]):
+    """Fold a photo's check outcomes into its score and reasons.
+
+    The outcomes are also kept in ``checks``, so stored results can be
+    rescored without rerunning the checks that do not depend on history.
+    """
+    result["checks"] = {stage: {"factor": factors.get(stage, 1.0), "reasons": list(reasons.get(stage, []))}
+                        for stage in REASON_ORDER if stage in factors or stage in reasons}
+    # Same product and reason order whatever order the checks ran in
+    for stage in REASON_ORDER:
+        result["score"] *= factors.get(stage, 1.0)
+        result["reason"].extend(reasons.get(stage, []))
+
+def finish_results(results: List[Dict[str, Any]]):
+    """Cluster analysis and final statuses."""
+    scoring_start = time.perf_counter()
 
     # Final fraud analysis
+    score_clusters(results)
+
+    stage_timer.add("scoring", time.perf_counter() - scoring_start)
     for result in results:
-        if result["status"] is not None:  # Skip already processed error results
+        PHOTOS_VERIFIED.inc(result["status"])
+
+def rescore_photos(stored: List[Dict[str, Any]], names: List[str]) -> List[Dict[str, Any]]:
+    """Results for photos verified before, without running the models again.
+
+    The stored per-photo outcomes are kept, except for the checks in
+    ``HISTORY_STAGES``: reuse is looked up again by the stored hashes and
+    the photos are clustered against the current location history, so a
+    resubmission is judged against every submission since, itself included.
+    """
+    results, factors, stage_reasons = [], [], []
+    for record, name in zip(stored, names):
+        if record["status"] == "Error":
+            results.append({**record, "file": name})
+            factors.append({})
+            stage_reasons.append({})
             continue
-        
-        cluster = result["cluster"]
-        cluster_photos = [r for r in results if r["cluster"] == cluster]
-        
-        # Update reasons based on cluster analysis
-        reasons = result["reason"]
-        
-        # Check for too many photos in same location
-        if len(cluster_photos) > 2:
-            result["score"] *= 0.6
-            reasons.append("Excessive photos in same location cluster")
+        checks = record.get("checks", {})
+        factors.append({stage: check["factor"] for stage, check in checks.items()
+                        if stage not in HISTORY_STAGES})
+        stage_reasons.append({stage: list(check["reasons"]) for stage, check in checks.items()
+                              if stage not in HISTORY_STAGES})
+        result = {**record, "file": name, "status": None, "score": 1.0, "reason": [], "cluster": -1,
+                  "skipped_stages": [s for s in record.get("skipped_stages", []) if s != "reuse"]}
+        if result.get("phash") is not None:
+            with stage_timer.stage("reuse"):
+                matches = find_reuse(result["phash"], result["dhash"])
+            factors[-1]["reuse"], stage_reasons[-1]["reuse"] = reuse_outcome(matches)
+        results.append(result)
+    cluster_results(results, stage_reasons)
+    for result, photo_factors, photo_reasons in zip(results, factors, stage_reasons):
+        if result["status"] is None:
+            assemble_result(result, photo_factors, photo_reasons)
+    finish_results(results)
+    return results
 
-        # Check for similar depths in cluster
-        for other in cluster_photos:
-            if other["file"] != result["file"]:
-                depth_diff = abs(result["depth"] - other["depth"])
-                if depth_diff < 2.0:
-                    result["score"] *= 0.7
-                    reasons.append("Similar photo depth in cluster")
-
-        # Check for suspicious timing
-        for other in cluster_photos:
-            if (other["file"] != result["file"] and 
-                other["metadata"]["timestamp"] and result["metadata"]["timestamp"]):
-                time_diff = abs((other["metadata"]["timestamp"] - 
-                               result["metadata"]["timestamp"]).total_seconds())
-                if time_diff < 15:
-                    result["score"] *= 0.6
-                    reasons.append("Photos taken too quickly")
-
-        # Check for multiple submissions from same device
-        same_device_count = sum(1 for r in cluster_photos 
-                              if r["metadata"]["device"] == result["metadata"]["device"])
-        if same_device_count > 2:
-            result["score"] *= 0.7
-            reasons.append("Multiple submissions from same device")
+def rescore_submission(stored: List[Dict[str, Any]], names: List[str]
+                       ) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """Run rescore_photos and also return its per-stage seconds."""
+    with trace() as spans:
+        results = rescore_photos(stored, names)
+    return results, dict(spans)
 
-        # Set final status based on score
-        result["score"] = max(0.0, min(1.0, result["score"]))  # Clamp between 0 and 1
-        if result["score"] < 0.5:
-            result["status"] = "Rejected"
-        elif result["score"] < 0.7:
-            result["status"] = "Suspicious"
-        else:
-            result["status"] = "Verified"
-
-    # Generate individual maps for photos with locations
-    for idx, result in enumerate(results, 1):
-        if result["metadata"]["lat"] is not None and result["metadata"]["lon"] is not None:
-            # Create individual map
-            m = folium.Map(
-                location=[result["metadata"]["lat"], result["metadata"]["lon"]], 
-                zoom_start=15
-            )
-            # Add marker for this location
-            folium.Marker(
-                [result["metadata"]["lat"], result["metadata"]["lon"]], 
-                popup=f"Image {idx}: {result['file']}<br>Status: {result['status']}"
-            ).add_to(m)
-            
-            # Save individual map
-            map_filename = f"map_{result['file'].replace('.', '_')}.html"
-            m.save(os.path.join("static", map_filename))
-            
-            # Add to map list
-            map_urls.append({
-                "url": map_filename,
-                "name": f"Image {idx}: {result['file']}"
-            })
-
-    # Generate combined map if there are multiple locations
-    if len(locations) > 1:
-        m = folium.Map(location=[locations[0][0], locations[0][1]], zoom_start=15)
-        for idx, result in enumerate(results, 1):
-            if result["metadata"]["lat"] is not None and result["metadata"]["lon"] is not None:
-                folium.Marker(
-                    [result["metadata"]["lat"], result["metadata"]["lon"]], 
-                    popup=f"Image {idx}: {result['file']}<br>Status: {result['status']}"
-                ).add_to(m)
-        m.save(os.path.join("static", "map_combined.html"))
-        map_urls.append({
-            "url": "map_combined.html",
-            "name": "Combined View"
-        })
-
-    return results, map_urls
\ No newline at end of file
+def verify_submission(file_paths: List[str], names: Optional[List[str]] = None,
+                      progress: Optional[Callable[[Dict[str, Any]], None]] = None
+                      ) -> Tuple[List[Dict[str, Any]], Dict[str, float]]:
+    """Run verify_photos and also return its per-stage seconds."""
+    with trace() as spans:
+        results = verify_photos(file_paths, names, progress)
+    return results, dict(spans)
@@ -0,0 +1,272 @@
+from typing import Any, Callable, Optional
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import logging
+import multiprocessing
+import time
+from instrumentation import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSaturated(Exception):
+    """Raised when every worker is busy and the admission queue is full."""
+
+
+class JobTimeout(Exception):
+    """Raised when a job runs past the pool's per-job timeout."""
+
+
+class WorkerLost(Exception):
+    """Raised when a worker's pipe breaks or closes mid-job (the process died)."""
+
+
+def _run_initializer(initializer: Optional[Callable[[], Any]]) -> bool:
+    if initializer is not None:
+        try:
+            initializer()
+        except Exception as e:
+            logger.error(f"Worker initialization failed: {e}")
+            return False
+    return True
+
+
+def _worker_main(conn, initializer: Optional[Callable[[], Any]]):
+    """Entry point of a worker process: load models once, then serve jobs.
+
+    Metrics recorded while running a job are drained and sent back with
+    its result, for the parent to merge into its own registry. Jobs that
+    want progress get a ``progress`` callback whose events are sent ahead
+    of the result.
+    """
+    ok = _run_initializer(initializer)
+    REGISTRY.drain()  # Warm-up calls are not traffic
+    conn.send(("ready", ok))
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if job is None:
+            break
+        func, args, streaming = job
+        kwargs = {"progress": lambda event: conn.send(("event", event, None))} if streaming else {}
+        try:
+            conn.send(("ok", func(*args, **kwargs), REGISTRY.drain()))
+        except Exception as e:
+            try:
+                conn.send(("error", e, REGISTRY.drain()))
+            except Exception:
+                conn.send(("error", RuntimeError(str(e)), None))
+
+
+class _Worker:
+    """One long-lived worker process and the pipe used to talk to it."""
+
+    def __init__(self, mp_context, initializer):
+        self.conn, child_conn = mp_context.Pipe()
+        self.process = mp_context.Process(target=_worker_main,
+                                          args=(child_conn, initializer),
+                                          daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def wait_ready(self, timeout: float) -> bool:
+        """Wait for the worker's models; returns whether they loaded cleanly."""
+        if not self.conn.poll(timeout):
+            self.kill()
+            raise JobTimeout("Worker did not finish loading models in time")
+        _, ok = self.conn.recv()
+        return ok
+
+    def call(self, func: Callable, args: tuple, timeout: float,
+             on_event: Optional[Callable[[Any], None]] = None):
+        deadline = time.monotonic() + timeout
+        try:
+            self.conn.send((func, args, on_event is not None))
+        except OSError as e:
+            raise WorkerLost(repr(e)) from e
+        while True:
+            try:
+                if not self.conn.poll(max(0.0, deadline - time.monotonic())):
+                    raise JobTimeout(f"Job exceeded {timeout:.0f}s timeout")
+                status, payload, metrics = self.conn.recv()
+                if status == "event":
+                    on_event(payload)
+                    continue
+            except JobTimeout:
+                raise
+            except Exception as e:
+                # The pipe is broken or was left partway through a reply
+                raise WorkerLost(repr(e)) from e
+            break
+        REGISTRY.merge(metrics)
+        if status == "error":
+            raise payload
+        return payload
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        self.kill()
+
+
+class VerificationPool:
+    """Warm pool of worker processes with bounded admission and per-job timeouts.
+
+    At most ``workers + queue_size`` jobs are admitted at once; further calls
+    to ``run`` fail fast with ``PoolSaturated``. A job that exceeds
+    ``job_timeout``, loses its worker or is cancelled has its worker process
+    killed and replaced in the background, so the timeout is reported without waiting for the
+    replacement to load its models. With
+    ``workers=0`` jobs run on threads in the calling process instead, which
+    keeps the same admission control but cannot interrupt a stuck job.
+    """
+
+    def __init__(self, workers: int, queue_size: int, job_timeout: float,
+                 initializer: Optional[Callable[[], Any]] = None,
+                 startup_timeout: float = 600.0):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.job_timeout = job_timeout
+        self.initializer = initializer
+        self.startup_timeout = startup_timeout
+        self.admitted = 0
+        self.ready = False
+        self._mp_context = multiprocessing.get_context("spawn")
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, 1) + queue_size,
+                                            thread_name_prefix="verify")
+        self._idle: Optional[asyncio.Queue] = None
+        self._all = []
+        self._respawns = set()
+        self._closed = False
+
+    @property
+    def capacity(self) -> int:
+        return max(self.workers, 1) + self.queue_size
+
+    @property
+    def saturated(self) -> bool:
+        return self.admitted >= self.capacity
+
+    @property
+    def queue_depth(self) -> int:
+        """Admitted jobs still waiting for a worker."""
+        return max(0, self.admitted - max(self.workers, 1))
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._mp_context, self.initializer)
+        worker.wait_ready(self.startup_timeout)
+        return worker
+
+    def _retire(self, worker: _Worker):
+        """Take a failed worker out of the pool and start its replacement."""
+        self._all = [w for w in self._all if w is not worker]
+        task = asyncio.get_running_loop().create_task(self._replace(worker))
+        self._respawns.add(task)
+        task.add_done_callback(self._respawns.discard)
+
+    async def _replace(self, worker: _Worker):
+        """Kill ``worker`` and spawn a replacement, retrying until one starts.
+
+        Runs on the default executor, so job threads are not held up while
+        the replacement loads its models.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, worker.kill)
+        delay = 1.0
+        while not self._closed:
+            try:
+                replacement = await loop.run_in_executor(None, self._spawn)
+            except Exception as e:
+                logger.error(f"Could not start a replacement worker: {e!r}; retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+                continue
+            if self._closed:
+                replacement.stop()
+                return
+            self._all.append(replacement)
+            self._idle.put_nowait(replacement)
+            return
+
+    def start(self):
+        """Spawn the workers and block until each has loaded and warmed its models.
+
+        ``ready`` is set only when every worker initialized successfully.
+        """
+        self._idle = asyncio.Queue()
+        if self.workers == 0:
+            self.ready = _run_initializer(self.initializer)
+            return
+        self._all = [_Worker(self._mp_context, self.initializer) for _ in range(self.workers)]
+        ok = True
+        for worker in self._all:
+            ok = worker.wait_ready(self.startup_timeout) and ok
+            self._idle.put_nowait(worker)
+        self.ready = ok
+        logger.info(f"Verification pool started with {self.workers} worker(s), ready={ok}")
+
+    async def run(self, func: Callable, *args, on_event: Optional[Callable[[Any], None]] = None):
+        """Run ``func(*args)`` on a worker and return its result.
+
+        With ``on_event``, ``func`` is also passed a ``progress`` callback;
+        each event it reports is handed to ``on_event`` on the event loop.
+        """
+        if self.saturated:
+            raise PoolSaturated("Verification queue is full")
+        self.admitted += 1
+        loop = asyncio.get_running_loop()
+        forward = None
+        if on_event is not None:
+            forward = lambda event: loop.call_soon_threadsafe(on_event, event)
+        try:
+            if self.workers == 0:
+                kwargs = {"progress": forward} if forward else {}
+                call = functools.partial(func, *args, **kwargs)
+                return await asyncio.wait_for(
+                    loop.run_in_executor(self._executor, call), self.job_timeout)
+            worker = await self._idle.get()
+            try:
+                result = await loop.run_in_executor(
+                    self._executor, worker.call, func, args, self.job_timeout, forward)
+            except (JobTimeout, WorkerLost) as e:
+                logger.error(f"Replacing verification worker {worker.process.pid}: {e!r}")
+                self._retire(worker)
+                if isinstance(e, JobTimeout):
+                    raise
+                raise RuntimeError("Verification worker exited unexpectedly") from e
+            except Exception:
+                # A clean error reply: the job failed but the worker finished it
+                self._idle.put_nowait(worker)
+                raise
+            except BaseException:
+                # Cancelled while the executor thread is still reading this
+                # worker's pipe, so its reply could reach the next job
+                logger.warning(f"Replacing verification worker {worker.process.pid}: job cancelled")
+                self._retire(worker)
+                raise
+            self._idle.put_nowait(worker)
+            return result
+        except asyncio.TimeoutError:
+            raise JobTimeout(f"Job exceeded {self.job_timeout:.0f}s timeout")
+        finally:
+            self.admitted -= 1
+
+    def shutdown(self):
+        self._closed = True
+        for task in self._respawns:
+            task.cancel()
+        for worker in self._all:
+            worker.stop()
+        self._executor.shutdown(wait=False)